@@ -21,13 +21,18 @@
         'security/orbit_security.xml',
         'security/ir.model.access.csv',
         
+        'data/ir_sequence_data.xml',
+
         # ***************************** actions planifier ****************
         'data/cron_update_image_count.xml',
         'data/cron_tag_order_overdue.xml',
+        'data/cron_stock_qty_ledger.xml',
+        'data/sale_order_installment_data.xml',
         # 'data/cron_sale_order.xml',
         # 'data/preorder_creditorder_inf_remind_email.xml',
 
         'wizard/preorder_advance_payment_wzd_view.xml',
+        'wizard/statement_import_views.xml',
         'wizard/crm_opportunity_to_quotation_orbit_views.xml',
         'wizard/crm_type_sale_for_quotation_views.xml',
 
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
 
 from . import controllers
+from . import product_image
+from . import sale_order_report
 # from . import orbit_api
@@ -1,21 +1,112 @@
 # -*- coding: utf-8 -*-
-# from odoo import http
-
-
-# class Orbit(http.Controller):
-#     @http.route('/orbit/orbit', auth='public')
-#     def index(self, **kw):
-#         return "Hello, world"
-
-#     @http.route('/orbit/orbit/objects', auth='public')
-#     def list(self, **kw):
-#         return http.request.render('orbit.listing', {
-#             'root': '/orbit/orbit',
-#             'objects': http.request.env['orbit.orbit'].search([]),
-#         })
-
-#     @http.route('/orbit/orbit/objects/<model("orbit.orbit"):obj>', auth='public')
-#     def object(self, obj, **kw):
-#         return http.request.render('orbit.object', {
-#             'object': obj
-#         })
+import hashlib
+import json
+
+from werkzeug.exceptions import BadRequest
+
+from odoo import http
+from odoo.http import request
+from odoo.tools.lru import LRU
+
+# Champs de product.template exposés par le catalogue public, lus en sudo ; free_qty
+# est ajouté à part, calculé sur les seuls emplacements de la société de la requête
+CATALOG_FIELDS = [
+    'name', 'list_price', 'promo_price', 'en_promo', 'is_preorder',
+    'preorder_price', 'creditorder_price',
+]
+CATALOG_GALLERY_FIELDS = ('image_1', 'image_2', 'image_3', 'image_4')
+CATALOG_MAX_LIMIT = 200
+
+# Pages JSON déjà rendues, indexées par ETag (ids et write_date des produits de la page)
+_catalog_cache = LRU(256)
+
+
+class OrbitCatalog(http.Controller):
+
+    @http.route('/orbit/api/catalog', type='http', auth='public', methods=['GET'], csrf=False)
+    def catalog(self, after=0, limit=50, **kw):
+        """ Catalogue produits en JSON, paginé par clé (``after`` = dernier id reçu).
+
+        La page est identifiée par une requête indexée sur (id, write_date) : si le
+        client a déjà cette version (If-None-Match), on répond 304 sans lecture ORM ;
+        sinon la page est servie depuis le cache, ou lue puis mise en cache. Toute
+        écriture sur un produit change son write_date, donc l'ETag de sa page.
+        """
+        try:
+            after = max(int(after), 0)
+            limit = min(max(int(limit), 1), CATALOG_MAX_LIMIT)
+        except ValueError:
+            raise BadRequest()
+
+        # Produits partagés ou de la société du site uniquement
+        company_id = request.env.company.id
+        request.env.cr.execute("""
+            SELECT id, write_date FROM product_template
+             WHERE active AND sale_ok AND id > %s
+               AND (company_id IS NULL OR company_id = %s)
+          ORDER BY id
+             LIMIT %s
+        """, [after, company_id, limit])
+        rows = request.env.cr.fetchall()
+        lang = request.env.lang or ''
+        etag = hashlib.sha1(repr((lang, company_id, limit, rows)).encode()).hexdigest()
+        headers = [('ETag', '"%s"' % etag), ('Cache-Control', 'public, no-cache')]
+        if etag in request.httprequest.if_none_match:
+            return request.make_response('', status=304, headers=headers)
+
+        body = _catalog_cache.get(etag)
+        if body is None:
+            body = _catalog_cache[etag] = json.dumps({
+                'products': self._read_catalog_page([row[0] for row in rows]),
+                'next': rows[-1][0] if len(rows) == limit else None,
+            }).encode()
+        return request.make_response(body, headers=headers + [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', len(body)),
+        ])
+
+    def _read_catalog_page(self, template_ids):
+        if not template_ids:
+            return []
+        env = request.env
+        templates = env['product.template'].sudo().browse(template_ids)
+        # Images de galerie présentes, en une requête sur les pièces jointes
+        env.cr.execute("""
+            SELECT res_id, array_agg(res_field) FROM ir_attachment
+             WHERE res_model = 'product.template' AND res_field IN %s AND res_id IN %s AND file_size > 0
+          GROUP BY res_id
+        """, [CATALOG_GALLERY_FIELDS, tuple(template_ids)])
+        gallery = dict(env.cr.fetchall())
+        free_qty = self._read_catalog_free_qty(template_ids)
+        products = []
+        for values in templates.read(CATALOG_FIELDS):
+            template_id = values['id']
+            values['free_qty'] = free_qty.get(template_id, 0.0)
+            values['images'] = {
+                'main': '/orbit/product/%s/image_1024.webp' % template_id,
+                'thumbnail': '/orbit/product/%s/image_256.webp' % template_id,
+                'gallery': [
+                    '/orbit/product/%s/%s_1024.webp' % (template_id, fname)
+                    for fname in CATALOG_GALLERY_FIELDS if fname in gallery.get(template_id, ())
+                ],
+            }
+            products.append(values)
+        return products
+
+    def _read_catalog_free_qty(self, template_ids):
+        """ Quantité libre (en stock, non réservée) par template, dans les emplacements
+        internes de la société de la requête uniquement ; le stock des autres sociétés
+        n'est jamais exposé. Toute variation de stock passe par le journal des stocks,
+        qui change le write_date des templates et donc l'ETag de leur page.
+        """
+        env = request.env
+        env.cr.execute("""
+            SELECT pp.product_tmpl_id, SUM(q.quantity - q.reserved_quantity)
+              FROM stock_quant q
+              JOIN stock_location l ON l.id = q.location_id
+              JOIN product_product pp ON pp.id = q.product_id
+             WHERE l.usage = 'internal' AND q.company_id = %s
+               AND pp.active AND pp.product_tmpl_id IN %s
+          GROUP BY pp.product_tmpl_id
+        """, [env.company.id, tuple(template_ids)])
+        return dict(env.cr.fetchall())
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import io
+
+from PIL import Image
+from werkzeug.exceptions import NotFound
+
+from odoo import http
+from odoo.http import request
+from odoo.tools.lru import LRU
+
+# Images de product.template pouvant être servies en WebP
+WEBP_IMAGE_FIELDS = {'image_1920', 'image_1024', 'image_512', 'image_256', 'image_128'} | {
+    'image_%s%s' % (index, size) for index in range(1, 5) for size in ('', '_1024', '_512', '_256', '_128')
+}
+
+# Qualité WebP par défaut, aussi utilisée si le paramètre quality est invalide
+DEFAULT_WEBP_QUALITY = 80
+
+# Images ré-encodées en WebP, indexées par (checksum de l'original, qualité)
+_webp_cache = LRU(512)
+
+
+class ProductImage(http.Controller):
+
+    @http.route('/orbit/product/<int:template_id>/<string:field>.webp', type='http', auth='public', methods=['GET'])
+    def product_image_webp(self, template_id, field, quality=DEFAULT_WEBP_QUALITY, **kw):
+        """ Sert une image produit ré-encodée en WebP.
+
+        L'encodage n'est fait qu'une fois par version de l'image (checksum de la pièce
+        jointe) ; les requêtes suivantes sont servies depuis le cache ou par un 304.
+        """
+        if field not in WEBP_IMAGE_FIELDS:
+            raise NotFound()
+        try:
+            quality = min(max(int(quality), 1), 100)
+        except (TypeError, ValueError):
+            quality = DEFAULT_WEBP_QUALITY
+        record = request.env['ir.binary']._find_record(res_model='product.template', res_id=template_id)
+        stream = request.env['ir.binary']._get_image_stream_from(record, field)
+        if not stream.etag:
+            # pas d'image : on sert l'image par défaut telle quelle
+            return stream.get_response()
+
+        etag = '%s-webp%s' % (stream.etag, quality)
+        if etag in request.httprequest.if_none_match:
+            return request.make_response('', status=304, headers=[('ETag', '"%s"' % etag)])
+
+        key = (stream.etag, quality)
+        webp = _webp_cache.get(key)
+        if webp is None:
+            image = Image.open(io.BytesIO(stream.read()))
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            output = io.BytesIO()
+            image.save(output, 'WEBP', quality=quality, method=4)
+            webp = _webp_cache[key] = output.getvalue()
+
+        return request.make_response(webp, headers=[
+            ('Content-Type', 'image/webp'),
+            ('Content-Length', len(webp)),
+            ('ETag', '"%s"' % etag),
+            ('Cache-Control', 'public, max-age=%s' % http.STATIC_CACHE),
+        ])
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import tempfile
+
+from werkzeug.exceptions import BadRequest
+from werkzeug.wsgi import wrap_file
+
+from odoo import http
+from odoo.http import content_disposition, request
+
+from odoo.addons.orbit.models.sale_order import REPORT_BATCH_FORMATS, REPORT_PDF_MAX_ORDERS
+
+
+class SaleOrderReport(http.Controller):
+
+    @http.route('/orbit/sale_order/report/batch', type='http', auth='user', methods=['GET'])
+    def sale_order_report_batch(self, ids='', format='zip', chunk_size=50, **kw):
+        """ Imprime un lot de commandes : ZIP d'un PDF par commande ou PDF fusionné.
+
+        Le fichier est construit sur disque, lot par lot, puis envoyé en flux. Le PDF
+        fusionné est limité à REPORT_PDF_MAX_ORDERS commandes (pages en mémoire).
+        """
+        if format not in REPORT_BATCH_FORMATS:
+            raise BadRequest()
+        try:
+            order_ids = [int(order_id) for order_id in ids.split(',') if order_id]
+            chunk_size = min(max(int(chunk_size), 1), 200)
+        except ValueError:
+            raise BadRequest()
+        if format == 'pdf' and len(order_ids) > REPORT_PDF_MAX_ORDERS:
+            raise BadRequest("PDF fusionné limité à %s commandes, utiliser format=zip" % REPORT_PDF_MAX_ORDERS)
+        orders = request.env['sale.order'].browse(order_ids).exists()
+        orders.check_access_rights('read')
+        orders.check_access_rule('read')
+
+        output = tempfile.TemporaryFile()
+        orders._render_report_batch(output, format, chunk_size=chunk_size)
+        size = output.tell()
+        output.seek(0)
+        mimetype = 'application/zip' if format == 'zip' else 'application/pdf'
+        response = request.make_response(wrap_file(request.httprequest.environ, output), headers=[
+            ('Content-Type', mimetype),
+            ('Content-Length', size),
+            ('Content-Disposition', content_disposition('commandes.%s' % format)),
+        ])
+        response.direct_passthrough = True
+        return response
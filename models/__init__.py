@@ -6,14 +6,21 @@ from . import orbit_affiliate
 from . import res_users
 from . import res_partner_bank
 from . import ir_ui_menu
+from . import ir_attachment
 
 from . import crm_lead
 from . import sale_order
 from . import preorder_order
+from . import sale_order_reminder
+from . import sale_order_installment
 from . import sale_order_line
 from . import product_product
+from . import product_preorder_capacity
 from . import purchase_order
 from . import web_comment_product
+from . import stock_qty_ledger
+from . import stock_quant
+from . import stock_move
 
 from . import account_move
 from . import account_payment
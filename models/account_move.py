@@ -1,5 +1,6 @@
 #-*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
+from collections import defaultdict
 
 
 class AccountMove(models.Model):
@@ -12,7 +13,29 @@ class AccountMove(models.Model):
         states={'draft': [("readonly", False)]}
     )
 
-    percentage_of_payment = fields.Float(string="Percentage of Payment",  compute='_compute_percentage_of_payment')
+    percentage_of_payment = fields.Float(string="Percentage of Payment",  compute='_compute_percentage_of_payment',
+                                         store=True, group_operator='avg')
+
+    def _auto_init(self):
+        # Colonne créée et remplie en une requête avant l'init ORM, pour éviter le
+        # recalcul Python de toutes les pièces à l'installation
+        cr = self.env.cr
+        if (not tools.column_exists(cr, 'account_move', 'percentage_of_payment')
+                and tools.column_exists(cr, 'account_move', 'sale_id')):
+            tools.create_column(cr, 'account_move', 'percentage_of_payment', 'double precision')
+            cr.execute("""
+                UPDATE account_move m
+                   SET percentage_of_payment = CASE WHEN so.amount_total > 0
+                                                    THEN COALESCE((SELECT SUM(l.price_subtotal)
+                                                                     FROM account_move_line l
+                                                                    WHERE l.move_id = m.id), 0)
+                                                         / so.amount_total * 100
+                                                    ELSE 0 END
+                  FROM sale_order so
+                 WHERE so.id = m.sale_id
+            """)
+            cr.execute("UPDATE account_move SET percentage_of_payment = 0 WHERE percentage_of_payment IS NULL")
+        return super(AccountMove, self)._auto_init()
 
     @api.depends('sale_id.amount_total', 'line_ids.price_subtotal')
     def _compute_percentage_of_payment(self):
@@ -28,13 +51,54 @@ class AccountMove(models.Model):
     def action_post(self):
         # Automatic reconciliation of payment when invoice confirmed.
         res = super(AccountMove, self).action_post()
-        sale_order = self.mapped('line_ids.sale_line_ids.order_id')
-        if sale_order and self.invoice_outstanding_credits_debits_widget is not False:
-            json_invoice_outstanding_data = (
-                self.invoice_outstanding_credits_debits_widget.get("content", [])
-            )
-            for data in json_invoice_outstanding_data:
-                if data.get("move_id") in sale_order.account_payment_ids.move_id.ids:
-                    self.js_assign_outstanding_line(line_id=data.get("id"))
+        self._reconcile_sale_advance_payments()
         return res
-    
\ No newline at end of file
+
+    def _reconcile_sale_advance_payments(self):
+        """ Lettre les factures postées avec les paiements d'acompte de leurs commandes.
+
+        Les lignes ouvertes des paiements (account_payment_ids) de toutes les commandes
+        sont lues en une recherche, puis lettrées par un seul reconcile() par couple
+        (partenaire commercial, compte) au lieu de passer par le widget des créances.
+        """
+        invoices = self.filtered(lambda move: move.state == 'posted' and move.is_invoice(include_receipts=True))
+        orders_by_invoice = {invoice: invoice.line_ids.sale_line_ids.order_id for invoice in invoices}
+        payment_moves = self.env['sale.order'].union(*orders_by_invoice.values()).account_payment_ids.move_id
+        if not payment_moves:
+            return
+
+        receivable_types = ('asset_receivable', 'liability_payable')
+        invoice_lines = invoices.line_ids.filtered(
+            lambda line: line.account_id.account_type in receivable_types and not line.reconciled)
+        payment_lines = self.env['account.move.line'].search([
+            ('move_id', 'in', payment_moves.ids),
+            ('account_id', 'in', invoice_lines.account_id.ids),
+            ('parent_state', '=', 'posted'),
+            ('reconciled', '=', False),
+            '|', ('amount_residual', '!=', 0.0), ('amount_residual_currency', '!=', 0.0),
+        ])
+        payment_lines_by_move = defaultdict(list)
+        for line in payment_lines:
+            payment_lines_by_move[line.move_id].append(line)
+        invoice_lines_by_move = defaultdict(list)
+        for line in invoice_lines:
+            invoice_lines_by_move[line.move_id].append(line)
+
+        to_reconcile = defaultdict(lambda: self.env['account.move.line'])
+        for invoice, orders in orders_by_invoice.items():
+            partner = invoice.commercial_partner_id
+            for invoice_line in invoice_lines_by_move[invoice]:
+                # comme le widget : lignes de sens opposé, même partenaire et même compte
+                matched = [
+                    line for move in orders.account_payment_ids.move_id
+                    for line in payment_lines_by_move.get(move, [])
+                    if line.account_id == invoice_line.account_id
+                    and line.partner_id.commercial_partner_id == partner
+                    and (line.balance < 0.0) == invoice.is_inbound()
+                ]
+                if matched:
+                    key = (partner.id, invoice_line.account_id.id)
+                    to_reconcile[key] |= invoice_line.union(*matched)
+
+        for lines in to_reconcile.values():
+            lines.reconcile()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+from .product_product import TEMPLATE_IMAGE_FIELDS
+
+
+class IrAttachment(models.Model):
+    _inherit = 'ir.attachment'
+
+    def _get_image_count_templates(self):
+        """ Templates dont le nombre d'images dépend de ces pièces jointes """
+        template_ids, product_ids = set(), set()
+        for attachment in self.sudo():
+            if attachment.res_model == 'product.template' and attachment.res_field in TEMPLATE_IMAGE_FIELDS:
+                template_ids.add(attachment.res_id)
+            elif attachment.res_model == 'product.product' and attachment.res_field == 'image_variant_1920':
+                product_ids.add(attachment.res_id)
+        templates = self.env['product.template'].browse(template_ids)
+        templates |= self.env['product.product'].browse(product_ids).exists().product_tmpl_id
+        return templates.exists()
+
+    def _update_image_count(self, templates):
+        if templates:
+            self.env.add_to_compute(templates._fields['image_count'], templates)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        attachments = super(IrAttachment, self).create(vals_list)
+        self._update_image_count(attachments._get_image_count_templates())
+        return attachments
+
+    def unlink(self):
+        templates = self._get_image_count_templates()
+        res = super(IrAttachment, self).unlink()
+        self._update_image_count(templates.exists())
+        return res
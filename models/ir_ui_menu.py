@@ -1,9 +1,55 @@
 # -*- coding: utf-8 -*-
-from odoo import fields, models, api, _, exceptions
+from odoo import fields, models, api, tools, _, exceptions
+from odoo.addons.base.models.ir_ui_menu import IrUiMenu
 
 
 class RestrictMenu(models.Model):
     _inherit = 'ir.ui.menu'
 
     # edit_menu_access : vue menu
-    restrict_user_ids = fields.Many2many('res.users')
\ No newline at end of file
+    # même table de relation que res.users.hide_menu_ids : les deux champs sont l'inverse l'un de l'autre
+    restrict_user_ids = fields.Many2many('res.users', 'ir_ui_menu_res_users_rel', 'ir_ui_menu_id', 'res_users_id')
+
+    def write(self, vals):
+        if 'restrict_user_ids' not in vals:
+            return super(RestrictMenu, self).write(vals)
+        users = self.restrict_user_ids
+        res = super(RestrictMenu, self).write(vals)
+        (users | self.restrict_user_ids)._bump_hide_menu_version()
+        return res
+
+    @api.model
+    @tools.ormcache_context('self._uid', 'debug', 'self.env.user.hide_menu_version', keys=('lang',))
+    def load_menus(self, debug):
+        """ Arbre des menus, en cache par utilisateur et version de ses menus masqués.
+
+        Le cache standard de load_menus n'est indexé que par uid : à chaque nouvelle
+        version, seule l'entrée périmée de cet utilisateur y est retirée avant le calcul.
+        """
+        self._discard_base_load_menus(debug)
+        return super(RestrictMenu, self).load_menus(debug)
+
+    @api.model
+    def _discard_base_load_menus(self, debug):
+        cache = IrUiMenu.load_menus.__cache__
+        entries, key, _counter = cache.lru(self)
+        try:
+            del entries[key + cache.key(self, debug)]
+        except KeyError:
+            pass
+
+    @api.model
+    def _visible_menu_ids(self, debug=False):
+        """ Retire des menus visibles (cache par groupes) ceux masqués pour l'utilisateur courant """
+        visible_ids = super(RestrictMenu, self)._visible_menu_ids(debug=debug)
+        hidden_ids = self._hidden_menu_ids(self.env.uid, self.env.user.hide_menu_version)
+        return visible_ids - hidden_ids if hidden_ids else visible_ids
+
+    @api.model
+    @tools.ormcache('uid', 'version')
+    def _hidden_menu_ids(self, uid, version):
+        """ Menus masqués pour un utilisateur ; la version (res.users.hide_menu_version) change
+        à chaque modification de ses menus masqués, ce qui invalide uniquement son entrée. """
+        self.env['res.users'].flush_model(['hide_menu_ids'])
+        self.env.cr.execute("SELECT ir_ui_menu_id FROM ir_ui_menu_res_users_rel WHERE res_users_id = %s", [uid])
+        return frozenset(row[0] for row in self.env.cr.fetchall())
@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 from odoo import fields, models, api, _, exceptions
-from odoo.tools import float_compare
+from odoo.fields import Command
+from odoo.osv import expression
+from odoo.tools import float_compare, split_every
+from collections import defaultdict
 from datetime import date, datetime, timedelta
 from . import sale_order
+from .sale_order_installment import INSTALLMENT_COUNT, INSTALLMENT_RANKS, INSTALLMENT_RATES
 
 import logging
 
@@ -69,6 +73,19 @@ class Preorder(models.Model):
         store=True, 
         help="Montant total des échéances dépassées"
     )
+    due_reference_date = fields.Date(
+        string="Date de référence échéance",
+        compute="_compute_is_due",
+        store=True,
+        help="Date à partir de laquelle days_util_due est compté (échéance impayée la plus ancienne)"
+    )
+    due_next_date = fields.Date(
+        string="Prochain changement d'échéance",
+        compute="_compute_is_due",
+        store=True,
+        index=True,
+        help="Prochaine date à laquelle l'état d'échéance ou le montant échu peut changer"
+    )
     
     payment_count = fields.Float(compute_sudo=True, compute="_compute_advance_payment")
 
@@ -93,6 +110,9 @@ class Preorder(models.Model):
 
     invoices = fields.One2many('account.move', 'sale_id', string="Invoices Sale Order", readonly=True)
 
+    # Échéancier normalisé (une ligne par échéance)
+    installment_ids = fields.One2many('sale.order.installment', 'order_id', string="Échéances", readonly=True)
+
     # Commande à crédit
     validation_rh_state = fields.Selection([
         ('pending', 'Validation en cours'),
@@ -116,6 +136,52 @@ class Preorder(models.Model):
 
 
     # ----------------------------------------------- Methodes ------------------------------------------------------
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        orders = super(Preorder, self).create(vals_list)
+        orders._sync_installments()
+        return orders
+
+    def write(self, vals):
+        res = super(Preorder, self).write(vals)
+        if 'type_sale' in vals:
+            self._sync_installments()
+        return res
+
+    def _sync_installments(self):
+        """ Crée ou supprime les lignes d'échéance selon le type de vente de chaque commande """
+        Installment = self.env['sale.order.installment'].sudo()
+        existing = {}
+        for installment in Installment.search([('order_id', 'in', self.ids)]):
+            existing.setdefault(installment.order_id.id, {})[installment.sequence] = installment
+        to_create = []
+        to_unlink = Installment
+        for order in self:
+            count = INSTALLMENT_COUNT.get(order.type_sale, 0)
+            current = existing.get(order.id, {})
+            to_create += [{'order_id': order.id, 'sequence': sequence}
+                          for sequence in range(1, count + 1) if sequence not in current]
+            for sequence, installment in current.items():
+                if sequence > count:
+                    to_unlink |= installment
+        to_unlink.unlink()
+        Installment.create(to_create)
+
+    @api.model
+    def _init_installments(self):
+        """ Génère l'échéancier des commandes existantes (appelé à l'installation/mise à jour) """
+        self.with_context(active_test=False).search([
+            ('type_sale', 'in', list(INSTALLMENT_COUNT)),
+        ])._sync_installments()
+
+    def _get_next_installment_amount(self):
+        """ Montant restant de la prochaine échéance non soldée, à défaut le reste à payer """
+        self.ensure_one()
+        installment = self.installment_ids.filtered(lambda inst: inst.state != 'paid').sorted('sequence')[:1]
+        if installment:
+            return min(installment.amount - installment.paid_amount, self.amount_residual)
+        return self.amount_residual
         
     def validate_rh(self):
 
@@ -219,9 +285,26 @@ class Preorder(models.Model):
     
     @api.model
     def cron_due_orders(self):
-        # Récupérer toutes les commandes
-        orders = self.search([])
-        orders._compute_is_due()
+        """ Ne recalcule que les commandes dont l'état d'échéance peut changer aujourd'hui.
+
+        Les autres commandes n'ont que leur compteur de jours qui évolue : il est mis à jour
+        par une seule requête à partir de due_reference_date.
+        """
+        current_date = fields.Date.context_today(self)
+        fnames = ['state_due', 'days_util_due', 'overdue_amount', 'due_reference_date', 'due_next_date']
+        orders = self.search([('due_next_date', '<=', current_date)])
+        if orders:
+            for fname in fnames:
+                self.env.add_to_compute(self._fields[fname], orders)
+            orders.flush_recordset(fnames)
+
+        self.env.cr.execute("""
+            UPDATE sale_order
+               SET days_util_due = %(today)s - due_reference_date
+             WHERE due_reference_date IS NOT NULL
+               AND days_util_due IS DISTINCT FROM %(today)s - due_reference_date
+        """, {'today': current_date})
+        self.invalidate_model(['days_util_due'])
         
     @api.depends('first_payment_date', 'first_payment_state', 'first_payment_amount',
                  'second_payment_date', 'second_payment_state', 'second_payment_amount',
@@ -235,6 +318,8 @@ class Preorder(models.Model):
             order.state_due = 'not_due'
             order.days_util_due = 0
             order.overdue_amount = 0.0
+            order.due_reference_date = False
+            order.due_next_date = False
 
             # 1. Cas des commandes de type preorder et creditorder
             if order.type_sale in ['preorder', 'creditorder']:
@@ -246,6 +331,7 @@ class Preorder(models.Model):
                     (order.third_payment_date, order.third_payment_state, order.third_payment_amount),
                     (order.fourth_payment_date, order.fourth_payment_state, order.fourth_payment_amount)
                 ]
+                boundary_dates = []
                 for pay_date, pay_state, pay_amount in payment_data:
                     # On considère uniquement les échéances ayant une date et dont l'état n'est pas renseigné (non payé)
                     if pay_date and not pay_state:
@@ -254,8 +340,15 @@ class Preorder(models.Model):
                         # Si l'échéance est dépassée (days_diff >= 0), on cumule le montant correspondant
                         if days_diff >= 0:
                             overdue_total += pay_amount
+                        # Le montant échu change le jour de l'échéance, l'état le lendemain
+                        boundary_dates += [pay_date, pay_date + timedelta(days=1)]
+
+                next_dates = [d for d in boundary_dates if d > current_date]
+                order.due_next_date = min(next_dates) if next_dates else False
 
                 if relevant_diffs:
+                    # Le retard affiché est compté depuis l'échéance impayée la plus ancienne
+                    order.due_reference_date = current_date - timedelta(days=max(relevant_diffs))
                     # S'il y a au moins une échéance dépassée, on considère la commande comme due
                     overdue_diffs = [d for d in relevant_diffs if d > 0]
                     if overdue_diffs:
@@ -278,6 +371,7 @@ class Preorder(models.Model):
                         order.state_due = 'due'
                         # Le nombre de jours en retard est calculé depuis la date de validité
                         order.days_util_due = (current_date - order.validity_date).days
+                        order.due_reference_date = order.validity_date
                         # Ici, on considère le montant restant dû comme montant en retard
                         order.overdue_amount = order.amount_residual
                     else:
@@ -285,6 +379,9 @@ class Preorder(models.Model):
                         order.state_due = 'not_due'
                         order.days_util_due = 0
                         order.overdue_amount = 0.0
+                else:
+                    # La commande deviendra échue le lendemain de sa date de validité
+                    order.due_next_date = order.validity_date + timedelta(days=1)
 
             # 3. Pour les autres cas, on laisse les valeurs par défaut : non due
             else:
@@ -293,91 +390,66 @@ class Preorder(models.Model):
                 order.overdue_amount = 0.0    
         
                     
+    def _get_installment_totals(self):
+        """ Montant des lignes (hors acomptes) et paiements validés de chaque commande.
+
+        Une somme groupée par requête pour tout le recordset ; les commandes en cours
+        d'édition (onchange) sont calculées depuis le cache.
+
+        :return: ({order_id: total TTC des lignes}, {order_id: total payé}) ; une commande
+                 sans ligne hors acompte est absente du premier dictionnaire
+        """
+        line_totals, paid_totals = {}, {}
+        saved = self.filtered(lambda order: isinstance(order.id, int))
+        if saved:
+            for group in self.env['sale.order.line'].read_group(
+                    [('order_id', 'in', saved.ids), ('is_downpayment', '=', False)],
+                    ['price_subtotal:sum', 'price_tax:sum'], ['order_id'], lazy=False):
+                line_totals[group['order_id'][0]] = group['price_subtotal'] + group['price_tax']
+            for group in self.env['account.payment'].read_group(
+                    [('sale_id', 'in', saved.ids), ('state', '=', 'posted')],
+                    ['amount:sum'], ['sale_id'], lazy=False):
+                paid_totals[group['sale_id'][0]] = group['amount']
+        for order in self - saved:
+            order_lines = order.order_line.filtered(lambda x: not x.is_downpayment)
+            if order_lines:
+                line_totals[order.id] = sum(order_lines.mapped('price_subtotal')) + sum(order_lines.mapped('price_tax'))
+            paid_totals[order.id] = sum(order.account_payment_ids.filtered(lambda x: x.state == 'posted').mapped('amount'))
+        return line_totals, paid_totals
+
     @api.depends(
+            'type_sale',
+            'order_line.is_downpayment',
             'order_line.price_subtotal', 
             'order_line.price_tax', 
-            'order_line.price_total', 
-            'account_payment_ids', 
+            'account_payment_ids.state',
+            'account_payment_ids.amount',
             'amount_residual',
             'date_approved_creditorder'
     )
     def _compute_order_data(self):
+        line_totals, paid_totals = self._get_installment_totals()
         for order in self:
-            order_lines = order.order_line.filtered(lambda x: not x.is_downpayment)
-            if order_lines:
-                sale_amount_total = sum(order_lines.mapped('price_subtotal')) + sum(order_lines.mapped('price_tax'))
-
-                if order.type_sale == 'preorder':
-                    # les montants des paiements
-                    amount1 = round(sale_amount_total * 0.3, 2)
-                    amount2 = round(sale_amount_total * 0.3, 2)
-                    amount3 = round(sale_amount_total * 0.4, 2)
-
-                    order.first_payment_amount = amount1
-                    order.second_payment_amount = amount2
-                    order.third_payment_amount = amount3
-
-                    payments_amount = sum(order.account_payment_ids.filtered(lambda x: x.state == 'posted').mapped('amount'))
-
-                    if payments_amount >= round(amount1):
-                        order.first_payment_state = True
-                    else:
-                        order.first_payment_state = False
-
-                    if payments_amount >= round(amount2 + amount1):
-                        order.second_payment_state = True
+            amounts = [0.0] * len(INSTALLMENT_RANKS)
+            states = [False] * len(INSTALLMENT_RANKS)
+            rates = INSTALLMENT_RATES.get(order.type_sale)
+            sale_amount_total = line_totals.get(order.id)
+            if rates and sale_amount_total is not None:
+                # les montants des paiements
+                payments_amount = paid_totals.get(order.id, 0.0)
+                cumulated_amount = 0.0
+                for index, rate in enumerate(rates):
+                    amounts[index] = round(sale_amount_total * rate, 2)
+                    cumulated_amount += amounts[index]
+                    if index == len(rates) - 1:
+                        # la dernière échéance n'est réglée qu'une fois la commande soldée
+                        states[index] = payments_amount >= order.amount_total and order.amount_residual <= 0
                     else:
-                        order.second_payment_state = False
+                        states[index] = payments_amount >= round(cumulated_amount)
 
-                    if payments_amount >= order.amount_total and order.amount_residual <= 0:
-                        order.third_payment_state = True
-                    else:
-                        order.third_payment_state = False
-                
-                if order.type_sale == 'creditorder':
-                    # les montants des paiements
-                    amount1 = round(sale_amount_total * 0.5, 2)
-                    amount2 = round(sale_amount_total * 0.2, 2)
-                    amount3 = round(sale_amount_total * 0.15, 2)
-                    amount4 = round(sale_amount_total * 0.15, 2)
-
-                    order.first_payment_amount = amount1
-                    order.second_payment_amount = amount2
-                    order.third_payment_amount = amount3
-                    order.fourth_payment_amount = amount4
-
-                    payments_amount = sum(order.account_payment_ids.filtered(lambda x: x.state == 'posted').mapped('amount'))
-
-                    if payments_amount >= round(amount1):
-                        order.first_payment_state = True
-                    else:
-                        order.first_payment_state = False
-
-                    if payments_amount >= round(amount2 + amount1):
-                        order.second_payment_state = True
-                    else:
-                        order.second_payment_state = False
-                    
-                    if payments_amount >= round(amount3 + amount2 + amount1):
-                        order.third_payment_state = True
-                    else:
-                        order.third_payment_state = False
-
-                    if payments_amount >= order.amount_total and order.amount_residual <= 0:
-                        order.fourth_payment_state = True
-                    else:
-                        order.fourth_payment_state = False
-
-            else:
-                order.first_payment_amount = 0.0
-                order.second_payment_amount = 0.0
-                order.third_payment_amount = 0.0
-                order.fourth_payment_amount = 0.0
-
-                order.first_payment_state = False
-                order.second_payment_state = False
-                order.third_payment_state = False
-                order.fourth_payment_state = False
+            for rank, amount, state in zip(INSTALLMENT_RANKS, amounts, states):
+                order['%s_payment_amount' % rank] = amount
+                order['%s_payment_state' % rank] = state
 
 
     @api.depends('date_order', 'commitment_date', 'date_approved_creditorder')
@@ -436,11 +508,24 @@ class Preorder(models.Model):
           3. Le montant résiduel du bon est calculé par : montant total - (paiements directs + paiements sur facture).
           4. L'état du paiement est déduit en fonction du montant résiduel.
         """
+        # Lignes de paiement de toutes les commandes du recordset, en une seule recherche
+        payment_moves = self.account_payment_ids._origin.move_id
+        receivable_lines = self.env['account.move.line'].search([
+            ('move_id', 'in', payment_moves.ids),
+            ('account_id.account_type', '=', 'asset_receivable'),
+            ('parent_state', '=', 'posted'),
+        ]) if payment_moves else self.env['account.move.line']
+        lines_by_move = defaultdict(lambda: self.env['account.move.line'])
+        for line in receivable_lines:
+            lines_by_move[line.move_id.id] |= line
+        # Factures de toutes les commandes, pour un chargement groupé des montants
+        self.invoice_ids.mapped('amount_residual')
+
         for order in self:
             # 1. Traitement des paiements directs
-            payment_lines = order.account_payment_ids.mapped("move_id.line_ids").filtered(
-                lambda line: line.account_id.account_type == "asset_receivable" and line.parent_state == "posted"
-            )
+            payment_lines = self.env['account.move.line']
+            for move_id in order.account_payment_ids._origin.move_id.ids:
+                payment_lines |= lines_by_move.get(move_id, self.env['account.move.line'])
             advance_amount = 0.0
             for line in payment_lines:
                 # Utilisation de la devise de la ligne, sinon celle de la société
@@ -451,8 +536,8 @@ class Preorder(models.Model):
                 # Conversion dans la devise du bon de commande si nécessaire
                 if line_currency != order.currency_id:
                     conversion_date = line.date or fields.Date.context_today(order)
-                    line_amount = line_currency._convert(
-                        line_amount, order.currency_id, order.company_id, conversion_date
+                    line_amount = self._convert_with_rate_cache(
+                        line_amount, line_currency, order.currency_id, order.company_id, conversion_date
                     )
                 advance_amount += line_amount
 
@@ -483,6 +568,21 @@ class Preorder(models.Model):
             order.amount_residual = computed_amount_residual
             order.advance_payment_status = payment_state
 
+    @api.model
+    def _convert_with_rate_cache(self, amount, from_currency, to_currency, company, conversion_date):
+        """ Équivalent de res.currency._convert, avec les taux mémorisés pour la transaction
+        par (devise source, devise cible, société, date). """
+        if from_currency == to_currency:
+            return amount
+        if not amount:
+            return 0.0
+        rates = self.env.cr.precommit.data.setdefault('orbit.currency_rates', {})
+        key = (from_currency.id, to_currency.id, company.id, conversion_date)
+        if key not in rates:
+            rates[key] = self.env['res.currency']._get_conversion_rate(
+                from_currency, to_currency, company, conversion_date)
+        return to_currency.round(amount * rates[key])
+
     def action_cancel(self):
         res = super(Preorder, self).action_cancel()
 
@@ -495,64 +595,65 @@ class Preorder(models.Model):
         else:
             return res
     
+    def _action_cancel(self):
+        self.env['product.preorder.capacity']._release(self)
+        return super(Preorder, self)._action_cancel()
+
     def action_confirm(self):
+        # Réservation atomique de la capacité de précommande, avant toute autre écriture
+        self.env['product.preorder.capacity']._reserve(
+            self.filtered(lambda order: order.type_sale == 'preorder'))
         res = super(Preorder, self).action_confirm()
-        
-        for order in self:
-            
-            if order.amount_residual <= 0:
-                order.write({
-                    'state': 'to_delivered'	
-                })
-            
-            # Enregistre l'utilisateur connecté
-            order.usr_confirmed = self.env.user
 
-        if self.type_sale == 'order':
-            # date = fields.Datetime.now()
-            # self._create_invoices(date).action_post()
-            self.message_post(body="La commande a été confirmée avec succès.")
-            return res
-        
-        if self.type_sale == 'preorder':
-            dates = [self.first_payment_date, self.second_payment_date, self.third_payment_date]
-            amounts = [self.first_payment_amount, self.second_payment_amount, self.third_payment_amount]
-            self._create_advance_invoices(dates, amounts)
-            self.message_post(body="La commande a été confirmée avec succès.")
+        self.filtered(lambda order: order.amount_residual <= 0).write({
+            'state': 'to_delivered'
+        })
+        # Enregistre l'utilisateur connecté
+        self.write({'usr_confirmed': self.env.user.id})
 
-            return res
-        
-        if self.type_sale == 'creditorder':
-            if self.validation_rh_state == 'validated':
-                if self.validation_admin_state == 'validated':
-                    if self.first_payment_state:
-                        self.date_approved_creditorder = fields.Datetime.now()
-                        return res
-                    else:
-                        raise exceptions.ValidationError(_("Veuillez procéder au paiement du premier acompte pour valider la commande à crédit."))
-                else:
-                    raise exceptions.ValidationError(_(
-                        "La validation du responsable de vente est requise pour finaliser la commande à crédit." 
-                        "Veuillez contacter un responsable pour approbation."
-                        ))
-            else:
+        for order in self.filtered(lambda order: order.type_sale == 'creditorder'):
+            if order.validation_rh_state != 'validated':
                 raise exceptions.ValidationError(_(
                     "La commande à crédit nécessite l'approbation du service des ressources humaines." 
                     "Veuillez contacter le responsable RH pour validation."
                     ))
+            if order.validation_admin_state != 'validated':
+                raise exceptions.ValidationError(_(
+                    "La validation du responsable de vente est requise pour finaliser la commande à crédit." 
+                    "Veuillez contacter un responsable pour approbation."
+                    ))
+            if not order.first_payment_state:
+                raise exceptions.ValidationError(_("Veuillez procéder au paiement du premier acompte pour valider la commande à crédit."))
+            order.date_approved_creditorder = fields.Datetime.now()
+
+        self.filtered(lambda order: order.type_sale == 'preorder')._create_advance_invoices()
+
+        confirmed = self.filtered(lambda order: order.type_sale in ('order', 'preorder'))
+        confirmed._message_log_batch(bodies={
+            order.id: "La commande a été confirmée avec succès." for order in confirmed
+        })
+        return res
         
     # @api.onchange('amount_residual')
     # def _onchange_state(self):
     #     if self.amount_residual <= 0:
     #         return self.write({ 'state': 'to_delivered' })
 
-    def _create_advance_invoices(self, dates, amounts):
-        for order in self:
-            self.env['sale.advance.payment.inv'].create({
-                'sale_order_ids': [(6, 0, order.ids)],
+    def _create_advance_invoices(self):
+        """ Crée les factures d'échéance des précommandes, un assistant par société """
+        ranks = INSTALLMENT_RANKS[:INSTALLMENT_COUNT['preorder']]
+        for company in self.company_id:
+            orders = self.filtered(lambda order: order.company_id == company)
+            schedules = {
+                order: [(order['%s_payment_date' % rank], order['%s_payment_amount' % rank]) for rank in ranks]
+                for order in orders
+            }
+            self.env['sale.advance.payment.inv'].with_company(company).create({
+                'sale_order_ids': [(6, 0, orders.ids)],
                 'advance_payment_method': 'fixed',
-                'fixed_amount': amounts[0],
-            })._create_invoices(order, dates, amounts)
+                # montant indicatif : chaque ligne d'acompte prend le montant de son échéance
+                'fixed_amount': schedules[orders[0]][0][1],
+            })._create_installment_invoices(schedules)
 
     @api.depends('invoices', 'invoice_ids')
     def check_invoices_paid(self):
@@ -605,7 +706,7 @@ class Preorder(models.Model):
     # -------------------------------------------------- Envoyer un email de rappel -------------------------------------
     
     @api.model
-    def action_send_due_emails(self):
+    def action_send_due_emails(self, batch_size=100):
         """ 
         Envoie :
           - Pour les commandes de type 'preorder' et 'creditorder' :
@@ -613,59 +714,134 @@ class Preorder(models.Model):
               * Un email de rappel 5 jours après, si la commande est échu (state_due = 'due' et délai de retard >= 5 jours).
           - Pour les commandes de type 'order' :
               * Un email de rappel 3 jours après la date d'échéance (basé sur validity_date) si la commande est échu.
+
+        Les emails sont générés par lots et mis dans la file d'attente de mail.mail ; le journal
+        sale.order.reminder garantit un seul envoi par commande, échéance et modèle.
         """
         current_date = fields.Date.context_today(self)
         sale_order_obj = self.env['sale.order']
+        informative_template = self.env.ref('orbit.preorder_creditorder_informative_template', raise_if_not_found=False)
+        reminder_template = self.env.ref('orbit.preorder_creditorder_reminder_template', raise_if_not_found=False)
+        overdue_template = self.env.ref('orbit.order_overdue_reminder_template', raise_if_not_found=False)
+
+        # relances à envoyer : (commande, numéro d'échéance, modèle)
+        reminders = []
 
         # --- Pour les commandes de type 'preorder' et 'creditorder' ---
-        orders_pre = sale_order_obj.search([
-            ('type_sale', 'in', ['preorder', 'creditorder']),
-            # On peut affiner la recherche éventuellement sur les commandes non payées
-        ])
+        ranks = ['first', 'second', 'third', 'fourth']
+        informative_domains = [[
+            ('%s_payment_date' % rank, '>=', current_date - timedelta(days=2)),
+            ('%s_payment_date' % rank, '<', current_date),
+            ('%s_payment_state' % rank, '=', False),
+        ] for rank in ranks]
+        orders_pre = sale_order_obj.search(expression.AND([
+            [('type_sale', 'in', ['preorder', 'creditorder'])],
+            expression.OR(informative_domains + [[('state_due', '=', 'due'), ('days_util_due', '>=', 5)]]),
+        ]))
 
         for order in orders_pre:
-            # 1. Email informatif 2 jours AVANT l'échéance pour une échéance non encore réglée.
-            # On vérifie pour chacune des échéances de paiement renseignées.
-            send_informative = False
             payment_dates = [
                 (order.first_payment_date, order.first_payment_state),
                 (order.second_payment_date, order.second_payment_state),
                 (order.third_payment_date, order.third_payment_state),
                 (order.fourth_payment_date, order.fourth_payment_state)
             ]
-            for pay_date, pay_state in payment_dates:
-                if pay_date and not pay_state:
-                    # Si la date d'échéance est dans 2 jours exactement
+            unpaid = [(index, pay_date) for index, (pay_date, pay_state) in enumerate(payment_dates, start=1)
+                      if pay_date and not pay_state]
+
+            # 1. Email informatif pour une échéance non encore réglée.
+            if informative_template:
+                for index, pay_date in unpaid:
                     if (pay_date - current_date).days < 0 and (pay_date - current_date).days >= -2:
-                        send_informative = True
+                        reminders.append((order, index, informative_template))
                         break
 
-            if send_informative:
-                # On utilise un modèle d'email préconfiguré pour l'information
-                template = self.env.ref('orbit.preorder_creditorder_informative_template', raise_if_not_found=False)
-                if template:
-                    template.send_mail(order.id, force_send=True)
-
-            # 2. Email de rappel 5 jours APRÈS l'échéance si la commande est échu
-            # On se base sur le champ calculé "days_util_due" qui indique le nombre de jours de retard
-            if order.state_due == 'due' and order.days_util_due >= 5:
-                template = self.env.ref('orbit.preorder_creditorder_reminder_template', raise_if_not_found=False)
-                if template:
-                    template.send_mail(order.id, force_send=True)
+            # 2. Email de rappel 5 jours APRÈS l'échéance impayée la plus ancienne si la commande est échu
+            if reminder_template and unpaid and order.state_due == 'due' and order.days_util_due >= 5:
+                index = min(unpaid, key=lambda item: item[1])[0]
+                reminders.append((order, index, reminder_template))
 
         # --- Pour les commandes de type 'order' ---
-        orders_order = sale_order_obj.search([
-            ('type_sale', '=', 'order'),
-            ('validity_date', '!=', False),  # On s'assure que la date d'échéance est renseignée
-            ('state_due', '=', 'due')
-        ])
-        for order in orders_order:
-            # Si la commande est échue, on envoie un email 3 jours APRÈS la date d'échéance (validity_date)
-            if (current_date - order.validity_date).days >= 3:
-                template = self.env.ref('orbit.order_overdue_reminder_template', raise_if_not_found=False)
-                if template:
-                    template.send_mail(order.id, force_send=True)
-                    
-        
+        # Si la commande est échue, on envoie un email 3 jours APRÈS la date d'échéance (validity_date)
+        if overdue_template:
+            orders_order = sale_order_obj.search([
+                ('type_sale', '=', 'order'),
+                ('validity_date', '<=', current_date - timedelta(days=3)),
+                ('state_due', '=', 'due')
+            ])
+            reminders += [(order, 0, overdue_template) for order in orders_order]
+
+        self._queue_reminder_emails(reminders, batch_size=batch_size)
 
+    @api.model
+    def _queue_reminder_emails(self, reminders, batch_size=100):
+        """ Génère par lots les emails des relances jamais envoyées et les met en file d'attente.
+
+        :param reminders: liste de (commande, numéro d'échéance, mail.template)
+        """
+        Reminder = self.env['sale.order.reminder'].sudo()
+        orders = self.browse({order.id for order, index, template in reminders})
+        already_sent = {
+            (reminder.order_id.id, reminder.installment, reminder.template_id.id)
+            for reminder in Reminder.search([('order_id', 'in', orders.ids)])
+        }
+        to_send = {}
+        for order, index, template in reminders:
+            key = (order.id, index, template.id)
+            if key not in already_sent:
+                already_sent.add(key)
+                to_send.setdefault(template, []).append((order.id, index))
+
+        for template, items in to_send.items():
+            for batch in split_every(batch_size, items):
+                res_ids = [order_id for order_id, index in batch]
+                rendered = template.generate_email(res_ids, [
+                    'subject', 'body_html', 'email_from', 'email_cc', 'email_to',
+                    'partner_to', 'reply_to', 'auto_delete', 'scheduled_date',
+                ])
+                mail_vals_list, reports = [], []
+                for order_id in res_ids:
+                    values = rendered[order_id]
+                    values['recipient_ids'] = [Command.link(pid) for pid in values.pop('partner_ids', [])]
+                    # Pièces jointes fixes du modèle, liées comme dans mail.template.send_mail
+                    attachment_ids = set(values.pop('attachment_ids', [])) | set(template.attachment_ids.ids)
+                    values['attachment_ids'] = [Command.link(aid) for aid in attachment_ids]
+                    reports.append(values.pop('attachments', []))
+                    if 'email_from' in values and not values.get('email_from'):
+                        values.pop('email_from')
+                    values.update(model=template.model, res_id=order_id)
+                    mail_vals_list.append(values)
+                mails = self.env['mail.mail'].sudo().create(mail_vals_list)
+                self._attach_rendered_reports(mails, reports)
+                Reminder.create([{
+                    'order_id': order_id,
+                    'installment': index,
+                    'template_id': template.id,
+                    'mail_id': mail.id,
+                } for (order_id, index), mail in zip(batch, mails)])
 
+    @api.model
+    def _attach_rendered_reports(self, mails, reports):
+        """ Crée en une fois les ir.attachment des rapports rendus par generate_email.
+
+        :param reports: pour chaque email, liste de (nom, contenu base64)
+        """
+        attachment_vals_list, owners = [], []
+        for mail, attachments in zip(mails, reports):
+            for name, datas in attachments:
+                attachment_vals_list.append({
+                    'name': name,
+                    'datas': datas,
+                    'type': 'binary',
+                    'res_model': 'mail.message',
+                    'res_id': mail.mail_message_id.id,
+                })
+                owners.append(mail)
+        if not attachment_vals_list:
+            return
+        attachments = self.env['ir.attachment'].sudo().create(attachment_vals_list)
+        by_mail = defaultdict(list)
+        for mail, attachment in zip(owners, attachments):
+            by_mail[mail].append(Command.link(attachment.id))
+        for mail, commands in by_mail.items():
+            mail.attachment_ids = commands
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from psycopg2.extras import execute_values
+
+from odoo import api, fields, models, _, exceptions
+
+
+class ProductPreorderCapacity(models.Model):
+    """ Compteur des quantités précommandées par produit, borné par preorder_quantity_allow.
+
+    Chaque confirmation réserve sa quantité par un UPDATE conditionnel sur la seule
+    ligne du produit : deux confirmations simultanées se sérialisent sur ce verrou de
+    ligne, jamais sur la table, et la seconde est refusée si la capacité est atteinte.
+    """
+    _name = 'product.preorder.capacity'
+    _description = "Capacité de précommande"
+    _log_access = False
+    _sql_constraints = [
+        ("product_tmpl_uniq", "UNIQUE(product_tmpl_id)", "Un seul compteur par produit."),
+    ]
+
+    product_tmpl_id = fields.Many2one('product.template', string="Produit", required=True, ondelete='cascade')
+    reserved_qty = fields.Float("Quantité réservée", digits='Product Unit of Measure', default=0.0)
+
+    @api.model
+    def _get_order_quantities(self, orders):
+        """ Quantités par (commande, produit) à réserver, dans l'unité du produit.
+
+        Seuls les produits à capacité limitée sont retenus (preorder_quantity_allow à 0
+        signifie sans limite).
+        """
+        quantities = defaultdict(float)
+        for line in orders.order_line:
+            template = line.product_id.product_tmpl_id
+            if line.display_type or not template.preorder_quantity_allow:
+                continue
+            quantities[line.order_id.id, template.id] += line.product_uom._compute_quantity(
+                line.product_uom_qty, line.product_id.uom_id)
+        return quantities
+
+    @api.model
+    def _reserve(self, orders):
+        """ Réserve la capacité des précommandes confirmées, refuse tout dépassement """
+        quantities = self._get_order_quantities(orders)
+        if not quantities:
+            return
+        totals = defaultdict(float)
+        for (order_id, template_id), qty in quantities.items():
+            totals[template_id] += qty
+
+        cr = self.env.cr
+        # Ordre des produits fixe : deux commandes sur les mêmes produits ne s'interbloquent pas
+        template_ids = sorted(totals)
+        execute_values(cr._obj, """
+            INSERT INTO product_preorder_capacity (product_tmpl_id, reserved_qty)
+            VALUES %s ON CONFLICT (product_tmpl_id) DO NOTHING
+        """, [(template_id, 0.0) for template_id in template_ids])
+        for template_id in template_ids:
+            cr.execute("""
+                UPDATE product_preorder_capacity c
+                   SET reserved_qty = c.reserved_qty + %(qty)s
+                  FROM product_template t
+                 WHERE c.product_tmpl_id = %(template_id)s
+                   AND t.id = c.product_tmpl_id
+                   AND c.reserved_qty + %(qty)s <= t.preorder_quantity_allow
+             RETURNING c.reserved_qty
+            """, {'qty': totals[template_id], 'template_id': template_id})
+            if not cr.fetchone():
+                template = self.env['product.template'].browse(template_id)
+                cr.execute("SELECT reserved_qty FROM product_preorder_capacity WHERE product_tmpl_id = %s",
+                           [template_id])
+                remaining = max(template.preorder_quantity_allow - cr.fetchone()[0], 0.0)
+                raise exceptions.UserError(_(
+                    "La capacité de précommande de %(product)s est atteinte : il reste %(remaining)s unité(s).",
+                    product=template.display_name, remaining=remaining))
+
+        self.env['sale.order.preorder.reservation'].sudo().create([
+            {'order_id': order_id, 'product_tmpl_id': template_id, 'quantity': qty}
+            for (order_id, template_id), qty in quantities.items()
+        ])
+        self.invalidate_model(['reserved_qty'])
+
+    @api.model
+    def _release(self, orders):
+        """ Libère la capacité réservée par des commandes annulées """
+        if not orders:
+            return
+        cr = self.env.cr
+        cr.execute("""
+            DELETE FROM sale_order_preorder_reservation WHERE order_id IN %s
+         RETURNING product_tmpl_id, quantity
+        """, [tuple(orders.ids)])
+        totals = defaultdict(float)
+        for template_id, qty in cr.fetchall():
+            totals[template_id] += qty
+        for template_id in sorted(totals):
+            cr.execute("""
+                UPDATE product_preorder_capacity
+                   SET reserved_qty = GREATEST(reserved_qty - %s, 0)
+                 WHERE product_tmpl_id = %s
+            """, [totals[template_id], template_id])
+        self.env['sale.order.preorder.reservation'].invalidate_model()
+        self.invalidate_model(['reserved_qty'])
+
+
+class SaleOrderPreorderReservation(models.Model):
+    """ Quantité réservée par une précommande confirmée, restituée à l'annulation """
+    _name = 'sale.order.preorder.reservation'
+    _description = "Réservation de capacité de précommande"
+    _sql_constraints = [
+        ("order_product_uniq", "UNIQUE(order_id, product_tmpl_id)", "Une réservation par commande et produit."),
+    ]
+
+    order_id = fields.Many2one('sale.order', string="Commande", required=True, index=True, ondelete='cascade')
+    product_tmpl_id = fields.Many2one('product.template', string="Produit", required=True, ondelete='cascade')
+    quantity = fields.Float("Quantité", digits='Product Unit of Measure')
+
+    def init(self):
+        """ Reprise des précommandes confirmées avant la mise en place des compteurs.
+
+        Les commandes confirmées sans réservation reçoivent la leur (quantités dans l'unité
+        du produit, produits à capacité limitée uniquement) et les compteurs sont augmentés
+        d'autant : sans cela, la capacité repartirait de zéro au déploiement. Sans effet
+        aux mises à jour suivantes, toutes les commandes ayant alors leurs réservations.
+        """
+        super(SaleOrderPreorderReservation, self).init()
+        cr = self.env.cr
+        cr.execute("""
+            INSERT INTO sale_order_preorder_reservation
+                   (order_id, product_tmpl_id, quantity, create_date, write_date)
+            SELECT so.id, pp.product_tmpl_id, SUM(sol.product_uom_qty / line_uom.factor * product_uom.factor),
+                   NOW() AT TIME ZONE 'UTC', NOW() AT TIME ZONE 'UTC'
+              FROM sale_order so
+              JOIN sale_order_line sol ON sol.order_id = so.id AND sol.display_type IS NULL
+              JOIN product_product pp ON pp.id = sol.product_id
+              JOIN product_template pt ON pt.id = pp.product_tmpl_id
+              JOIN uom_uom line_uom ON line_uom.id = sol.product_uom
+              JOIN uom_uom product_uom ON product_uom.id = pt.uom_id
+             WHERE so.type_sale = 'preorder'
+               AND so.state IN ('sale', 'to_delivered', 'delivered', 'done')
+               AND COALESCE(pt.preorder_quantity_allow, 0) > 0
+               AND NOT EXISTS (SELECT 1 FROM sale_order_preorder_reservation r WHERE r.order_id = so.id)
+          GROUP BY so.id, pp.product_tmpl_id
+       ON CONFLICT (order_id, product_tmpl_id) DO NOTHING
+         RETURNING product_tmpl_id, quantity
+        """)
+        totals = defaultdict(float)
+        for template_id, qty in cr.fetchall():
+            totals[template_id] += qty
+        if totals:
+            execute_values(cr._obj, """
+                INSERT INTO product_preorder_capacity AS c (product_tmpl_id, reserved_qty)
+                VALUES %s ON CONFLICT (product_tmpl_id)
+                DO UPDATE SET reserved_qty = c.reserved_qty + EXCLUDED.reserved_qty
+            """, sorted(totals.items()))
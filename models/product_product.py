@@ -1,8 +1,14 @@
-from odoo import models, fields, api
+from psycopg2.extras import execute_values
+
+from odoo import models, fields, api, tools
+from odoo.tools import split_every
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Champs image comptés dans image_count (pièces jointes de product.template)
+TEMPLATE_IMAGE_FIELDS = ('image_1920', 'image_1', 'image_2', 'image_3', 'image_4')
+
 class ProductTemplate(models.Model):
     _inherit = 'product.template'
 
@@ -45,21 +51,22 @@ class ProductTemplate(models.Model):
         store=True
     )
 
-    preordered_qty = fields.Float('Preordered Quantity', compute='_compute_preordered_qty', store=True, 
+    preordered_qty = fields.Float('Preordered Quantity', compute='_compute_sale_reserved_qty', store=True, 
                                   help="Total quantity of products that have been preordered by customers but not yet delivered."
                                   )
     
-    creditorder_qty = fields.Float('Creditorder Quantity', compute='_compute_creditorder_qty', store=True, 
+    creditorder_qty = fields.Float('Creditorder Quantity', compute='_compute_sale_reserved_qty', store=True, 
                                   help="Total quantity of products that have been creditordered by customers but not yet delivered."
                                   )
     
-    ordered_qty = fields.Float('Ordered Quantity', compute='_compute_ordered_qty', store=True, 
+    ordered_qty = fields.Float('Ordered Quantity', compute='_compute_sale_reserved_qty', store=True, 
                                   help="Total quantity of products that have been ordered by customers but not yet delivered."
                                   )
     
+    # tenu à jour par le journal des stocks (orbit.stock.qty.ledger) : somme des variantes actives
     free_qty = fields.Float(
-        'Free To Use Quantity ', related='product_variant_ids.free_qty',
-        digits='Product Unit of Measure', store=True,
+        'Free To Use Quantity ', readonly=True,
+        digits='Product Unit of Measure',
         help="Forecast quantity (computed as Quantity On Hand "
              "- reserved quantity)\n"
              "In a context with a single Stock Location, this includes "
@@ -72,13 +79,35 @@ class ProductTemplate(models.Model):
     
     
     # ------------------ Gestion des images pour les produits et les variantes de produits ------------------ 
-    image_1 = fields.Binary(string='Image 1')
-    image_2 = fields.Binary(string='Image 2')
-    image_3 = fields.Binary(string='Image 3')
-    image_4 = fields.Binary(string='Image 4')
+    image_1 = fields.Image(string='Image 1', max_width=1920, max_height=1920)
+    image_1_1024 = fields.Image("Image 1 1024", related="image_1", max_width=1024, max_height=1024, store=True)
+    image_1_512 = fields.Image("Image 1 512", related="image_1", max_width=512, max_height=512, store=True)
+    image_1_256 = fields.Image("Image 1 256", related="image_1", max_width=256, max_height=256, store=True)
+    image_1_128 = fields.Image("Image 1 128", related="image_1", max_width=128, max_height=128, store=True)
+    image_2 = fields.Image(string='Image 2', max_width=1920, max_height=1920)
+    image_2_1024 = fields.Image("Image 2 1024", related="image_2", max_width=1024, max_height=1024, store=True)
+    image_2_512 = fields.Image("Image 2 512", related="image_2", max_width=512, max_height=512, store=True)
+    image_2_256 = fields.Image("Image 2 256", related="image_2", max_width=256, max_height=256, store=True)
+    image_2_128 = fields.Image("Image 2 128", related="image_2", max_width=128, max_height=128, store=True)
+    image_3 = fields.Image(string='Image 3', max_width=1920, max_height=1920)
+    image_3_1024 = fields.Image("Image 3 1024", related="image_3", max_width=1024, max_height=1024, store=True)
+    image_3_512 = fields.Image("Image 3 512", related="image_3", max_width=512, max_height=512, store=True)
+    image_3_256 = fields.Image("Image 3 256", related="image_3", max_width=256, max_height=256, store=True)
+    image_3_128 = fields.Image("Image 3 128", related="image_3", max_width=128, max_height=128, store=True)
+    image_4 = fields.Image(string='Image 4', max_width=1920, max_height=1920)
+    image_4_1024 = fields.Image("Image 4 1024", related="image_4", max_width=1024, max_height=1024, store=True)
+    image_4_512 = fields.Image("Image 4 512", related="image_4", max_width=512, max_height=512, store=True)
+    image_4_256 = fields.Image("Image 4 256", related="image_4", max_width=256, max_height=256, store=True)
+    image_4_128 = fields.Image("Image 4 128", related="image_4", max_width=128, max_height=128, store=True)
     
     # Nombre d'images enregistré pour un produit
     image_count = fields.Integer("Nombre d'images", compute="_compute_image_count", store=True, help="Total number of images associated with this product.")
+
+    # Avis clients (web.commentaire) agrégés : seuls les commentaires notés (review > 0) comptent
+    web_comment_ids = fields.One2many('web.commentaire', 'product_id', string="Commentaires")
+    review_count = fields.Integer("Nombre d'avis", compute='_compute_review_stats', store=True)
+    review_avg = fields.Float("Note moyenne", compute='_compute_review_stats', store=True, index=True, digits=(3, 2),
+                              group_operator='avg')
     
     # ------------------ Gestion des prix sur le produit ------------------
     
@@ -96,16 +125,62 @@ class ProductTemplate(models.Model):
         return float(self.env['ir.config_parameter'].sudo().get_param('product.global_markup_percentage', default=15))
     
     @api.model
-    def update_product_prices(self):
-        """ Met à jour automatiquement le prix de vente si inférieur au prix calculé """
-        products = self.search([])
-        for product in products:
-            if product.markup_percentage:
-                min_price = product.standard_price * (1 + product.markup_percentage / 100)
-            else:
-                min_price = product.standard_price * 1.15  # Calcul du prix minimum
-            if product.list_price < min_price:
-                product.list_price = min_price  # Mise à jour du prix de vente
+    def update_product_prices(self, dry_run=False, chunk_size=1000):
+        """ Met à jour automatiquement le prix de vente si inférieur au prix calculé
+
+        Les produits sous leur prix plancher (coût * (1 + marge)) sont identifiés par une
+        seule requête, puis mis à jour par lots avec une écriture ensembliste. Seuls les
+        caches des produits modifiés sont invalidés.
+
+        :param dry_run: ne rien écrire, retourner seulement le rapport
+        :param chunk_size: nombre de produits mis à jour par requête
+        :return: liste de {'id', 'name', 'standard_price', 'old_price', 'new_price'}
+        """
+        digits = self.env['decimal.precision'].precision_get('Product Price')
+        self.flush_model(['list_price', 'markup_percentage', 'active'])
+        self.env['product.product'].flush_model(['product_tmpl_id', 'active'])
+        # standard_price est un champ company_dependent (ir.property) des variantes ;
+        # comme _compute_standard_price, seuls les templates à variante unique sont concernés
+        self.env.cr.execute("""
+            SELECT t.id, t.name, t.list_price, s.standard_price, s.min_price
+              FROM product_template t
+              JOIN (SELECT pp.product_tmpl_id,
+                           MAX(COALESCE(prop.value_float, 0)) AS standard_price,
+                           ROUND((MAX(COALESCE(prop.value_float, 0)) * (1 + COALESCE(NULLIF(MAX(tmpl.markup_percentage), 0), 15) / 100.0))::numeric, %(digits)s) AS min_price
+                      FROM product_product pp
+                      JOIN product_template tmpl ON tmpl.id = pp.product_tmpl_id
+                 LEFT JOIN ir_property prop ON prop.name = 'standard_price'
+                                           AND prop.res_id = 'product.product,' || pp.id
+                                           AND prop.company_id = %(company_id)s
+                     WHERE pp.active
+                  GROUP BY pp.product_tmpl_id
+                    HAVING COUNT(pp.id) = 1) s ON s.product_tmpl_id = t.id
+             WHERE t.active
+               AND COALESCE(t.list_price, 0) < s.min_price
+          ORDER BY t.id
+        """, {'digits': digits, 'company_id': self.env.company.id})
+        report = [{
+            'id': template_id,
+            'name': name.get(self.env.lang) or name.get('en_US') if isinstance(name, dict) else name,
+            'standard_price': standard_price,
+            'old_price': old_price or 0.0,
+            'new_price': float(min_price),
+        } for template_id, name, old_price, standard_price, min_price in self.env.cr.fetchall()]
+        if dry_run or not report:
+            return report
+
+        for lines in split_every(chunk_size, report):
+            execute_values(self.env.cr._obj, """
+                UPDATE product_template t
+                   SET list_price = v.new_price, write_date = (now() at time zone 'UTC'), write_uid = %s
+                  FROM (VALUES %%s) AS v(id, new_price)
+                 WHERE t.id = v.id
+            """ % self.env.uid, [(line['id'], line['new_price']) for line in lines])
+            templates = self.browse(line['id'] for line in lines)
+            templates.invalidate_recordset(['list_price', 'write_date', 'write_uid'])
+            templates.modified(['list_price'])
+        _logger.info("Mise à jour des prix : %s produit(s) réévalué(s)", len(report))
+        return report
                     
     @api.onchange('markup_percentage')
     def _onchange_markup_percentage(self):
@@ -153,16 +228,49 @@ class ProductTemplate(models.Model):
                 if template.list_price < min_price:
                     template.list_price = min_price
 
-    @api.depends('image_1920', 'product_variant_ids.image_variant_1920', 'image_1', 'image_2', 'image_3', 'image_4')
+    def _get_image_counts(self):
+        """ Nombre d'images par template, d'après les seules métadonnées des pièces jointes
+        (existence et taille, par res_field) : aucune image n'est lue depuis le filestore.
+
+        :return: {template_id: nombre d'images du template et de ses variantes actives}
+        """
+        template_ids = tuple(self._origin.ids)
+        if not template_ids:
+            return {}
+        self.env['ir.attachment'].flush_model(['res_model', 'res_field', 'res_id', 'file_size'])
+        self.env['product.product'].flush_model(['product_tmpl_id', 'active'])
+        self.env.cr.execute("""
+            SELECT COALESCE(pp.product_tmpl_id, a.res_id), COUNT(*)
+              FROM ir_attachment a
+         LEFT JOIN product_product pp ON a.res_model = 'product.product' AND pp.id = a.res_id
+             WHERE a.file_size > 0
+               AND ((a.res_model = 'product.template' AND a.res_field IN %s AND a.res_id IN %s)
+                 OR (a.res_model = 'product.product' AND a.res_field = 'image_variant_1920'
+                     AND pp.active AND pp.product_tmpl_id IN %s))
+          GROUP BY 1
+        """, [TEMPLATE_IMAGE_FIELDS, template_ids, template_ids])
+        return dict(self.env.cr.fetchall())
+
+    # Les ajouts/suppressions d'images sont répercutés par ir.attachment (create/unlink) ;
+    # l'archivage d'une variante retire ses images du compte
+    @api.depends('product_variant_ids', 'product_variant_ids.active')
     def _compute_image_count(self):
+        counts = self._get_image_counts()
         for template in self:
-            # Comptage des images du template
-            images = [template.image_1920, template.image_1, template.image_2, template.image_3, template.image_4]
-            count = sum(1 for image in images if image)
+            template.image_count = counts.get(template._origin.id, 0)
 
-            # Comptage des images des variantes
-            count += len(template.product_variant_ids.filtered(lambda p: p.image_variant_1920))
-            template.image_count = count
+    @api.depends('web_comment_ids.review')
+    def _compute_review_stats(self):
+        # Recalculé par l'ORM pour les seuls produits dont un commentaire change
+        template_ids = [template_id for template_id in self._origin.ids if template_id]
+        stats = {}
+        if template_ids:
+            for group in self.env['web.commentaire'].read_group(
+                    [('product_id', 'in', template_ids), ('review', '>', 0)],
+                    ['review:avg'], ['product_id'], lazy=False):
+                stats[group['product_id'][0]] = (group['__count'], group['review'])
+        for template in self:
+            template.review_count, template.review_avg = stats.get(template._origin.id, (0, 0.0))
             
     # def write(self, vals):
     #     """ Met à jour le compteur d'images à chaque modification """
@@ -172,10 +280,19 @@ class ProductTemplate(models.Model):
     #     return res
     
     @api.model
-    def cron_update_image_count(self):
-        """ Recalcul périodique du nombre d'images via une tâche cron """
-        products = self.search([])
-        products._compute_image_count()
+    def cron_update_image_count(self, batch_size=5000):
+        """ Recalcul périodique du nombre d'images via une tâche cron
+
+        Sert de réconciliation : seuls les templates dont le compteur diffère sont réécrits.
+        """
+        templates = self.with_context(active_test=False).search([])
+        for template_ids in split_every(batch_size, templates.ids):
+            batch = self.browse(template_ids)
+            counts = batch._get_image_counts()
+            outdated = batch.filtered(lambda t: t.image_count != counts.get(t.id, 0))
+            if outdated:
+                self.env.add_to_compute(self._fields['image_count'], outdated)
+                outdated.flush_recordset(['image_count'])
         self._cr.commit()  # Forcer la sauvegarde en base pour éviter les pertes si la tâche plante
             
     @api.depends('rate_price')
@@ -186,45 +303,42 @@ class ProductTemplate(models.Model):
             else:
                 prod.promo_price = prod.list_price
     
-    @api.depends('qty_available', 'outgoing_qty')
-    def _compute_preordered_qty(self):
-        for product in self:
-            # Filtrer les lignes de commande client qui sont dans un état de précommande (par exemple, 'preorder')
-            preordered_lines = self.env['sale.order.line'].search([
-                ('product_id.product_tmpl_id', '=', product.id),
-                ('order_id.state', 'in', ['sale', 'to_delivered']),
-                ('order_id.type_sale', '=', 'preorder')
-                # Assumant que 'preorder' est l'état d'une précommande
-            ])
-            #if preordered_lines.
-            product.preordered_qty = sum(line.product_uom_qty for line in preordered_lines) - sum(line.qty_delivered for line in preordered_lines)
+    def _get_sale_reserved_qty(self):
+        """ Quantités commandées non livrées par template et par type de vente.
+
+        Une seule requête agrégée (GROUP BY template, type_sale) pour tout le recordset,
+        quel que soit le nombre de templates : {template_id: {type_sale: quantité}}.
+        """
+        template_ids = tuple(self._origin.ids)
+        if not template_ids:
+            return {}
+        self.env['sale.order.line'].flush_model(['order_id', 'product_id', 'product_uom_qty', 'qty_delivered'])
+        self.env['sale.order'].flush_model(['state', 'type_sale'])
+        self.env['product.product'].flush_model(['product_tmpl_id'])
+        self.env.cr.execute("""
+            SELECT pp.product_tmpl_id, so.type_sale,
+                   SUM(sol.product_uom_qty) - SUM(sol.qty_delivered)
+              FROM sale_order_line sol
+              JOIN sale_order so ON so.id = sol.order_id
+              JOIN product_product pp ON pp.id = sol.product_id
+             WHERE pp.product_tmpl_id IN %s
+               AND so.state IN ('sale', 'to_delivered')
+          GROUP BY pp.product_tmpl_id, so.type_sale
+        """, [template_ids])
+        result = {}
+        for template_id, type_sale, qty in self.env.cr.fetchall():
+            result.setdefault(template_id, {})[type_sale] = qty or 0.0
+        return result
 
     @api.depends('qty_available', 'outgoing_qty')
-    def _compute_creditorder_qty(self):
-        for product in self:
-            # Filtrer les lignes de commande client qui sont dans un état de commande crédit (par exemple, 'creditorder')
-            creditorder_lines = self.env['sale.order.line'].search([
-                ('product_id.product_tmpl_id', '=', product.id),
-                ('order_id.state', 'in', ['sale', 'to_delivered']),
-                ('order_id.type_sale', '=', 'creditorder')
-                # Assumant que 'preorder' est l'état d'une précommande
-            ])
-            #if preordered_lines.
-            product.creditorder_qty = sum(line.product_uom_qty for line in creditorder_lines) - sum(line.qty_delivered for line in creditorder_lines)
-            
-            
-    @api.depends('qty_available', 'outgoing_qty')
-    def _compute_ordered_qty(self):
+    def _compute_sale_reserved_qty(self):
+        """ Calcule preordered_qty, creditorder_qty et ordered_qty en une seule passe """
+        quantities = self._get_sale_reserved_qty()
         for product in self:
-            # Filtrer les lignes de commande client qui sont dans un état de précommande (par exemple, 'preorder')
-            ordered_lines = self.env['sale.order.line'].search([
-                ('product_id.product_tmpl_id', '=', product.id),
-                ('order_id.state', 'in', ['sale', 'to_delivered']),
-                ('order_id.type_sale', '=', 'order')
-                # Assumant que 'preorder' est l'état d'une précommande
-            ])
-            #if preordered_lines.
-            product.ordered_qty = sum(line.product_uom_qty for line in ordered_lines) - sum(line.qty_delivered for line in ordered_lines)
+            qty_by_type = quantities.get(product._origin.id, {})
+            product.preordered_qty = qty_by_type.get('preorder', 0.0)
+            product.creditorder_qty = qty_by_type.get('creditorder', 0.0)
+            product.ordered_qty = qty_by_type.get('order', 0.0)
             
     
     @api.depends('qty_available', 'outgoing_qty')
@@ -267,9 +381,10 @@ class Product(models.Model):
 
     
     # qty_available, virtual_available, free_qty, incoming_qty, outgoing_qty
+    # Champs stockés alimentés par incréments via orbit.stock.qty.ledger (voir _ledger_quantities_updated)
     qty_available = fields.Float(
-        'Quantity On Hand', compute='_compute_quantities', search='_search_qty_available',
-        digits='Product Unit of Measure', compute_sudo=False, store=True,
+        'Quantity On Hand', compute='_compute_ledger_quantities',
+        digits='Product Unit of Measure', store=True,
         help="Current quantity of products.\n"
              "In a context with a single Stock Location, this includes "
              "goods stored at this Location, or any of its children.\n"
@@ -281,8 +396,8 @@ class Product(models.Model):
              "Otherwise, this includes goods stored in any Stock Location "
              "with 'internal' type.")
     virtual_available = fields.Float(
-        'Forecasted Quantity', compute='_compute_quantities', search='_search_virtual_available',
-        digits='Product Unit of Measure', compute_sudo=False, store=True,
+        'Forecasted Quantity', compute='_compute_ledger_quantities',
+        digits='Product Unit of Measure', store=True,
         help="Forecast quantity (computed as Quantity On Hand "
              "- Outgoing + Incoming)\n"
              "In a context with a single Stock Location, this includes "
@@ -293,8 +408,8 @@ class Product(models.Model):
              "Otherwise, this includes goods stored in any Stock Location "
              "with 'internal' type.")
     free_qty = fields.Float(
-        'Free To Use Quantity ', compute='_compute_quantities', search='_search_free_qty',
-        digits='Product Unit of Measure', compute_sudo=False, store=True,
+        'Free To Use Quantity ', compute='_compute_ledger_quantities',
+        digits='Product Unit of Measure', store=True,
         help="Forecast quantity (computed as Quantity On Hand "
              "- reserved quantity)\n"
              "In a context with a single Stock Location, this includes "
@@ -305,8 +420,8 @@ class Product(models.Model):
              "Otherwise, this includes goods stored in any Stock Location "
              "with 'internal' type.")
     incoming_qty = fields.Float(
-        'Incoming', compute='_compute_quantities', search='_search_incoming_qty',
-        digits='Product Unit of Measure', compute_sudo=False, store=True,
+        'Incoming', compute='_compute_ledger_quantities',
+        digits='Product Unit of Measure', store=True,
         help="Quantity of planned incoming products.\n"
              "In a context with a single Stock Location, this includes "
              "goods arriving to this Location, or any of its children.\n"
@@ -316,8 +431,8 @@ class Product(models.Model):
              "Otherwise, this includes goods arriving to any Stock "
              "Location with 'internal' type.")
     outgoing_qty = fields.Float(
-        'Outgoing', compute='_compute_quantities', search='_search_outgoing_qty',
-        digits='Product Unit of Measure', compute_sudo=False, store=True,
+        'Outgoing', compute='_compute_ledger_quantities',
+        digits='Product Unit of Measure', store=True,
         help="Quantity of planned outgoing products.\n"
              "In a context with a single Stock Location, this includes "
              "goods leaving this Location, or any of its children.\n"
@@ -327,10 +442,86 @@ class Product(models.Model):
              "Otherwise, this includes goods leaving any Stock "
              "Location with 'internal' type.")
     
+    def _compute_ledger_quantities(self):
+        """ Valeur initiale à la création ; ensuite seul le journal des stocks met à jour ces champs """
+        products = self.filtered(lambda p: p._origin.id)
+        quantities = products._origin._compute_quantities_dict(None, None, None) if products else {}
+        for product in self:
+            values = quantities.get(product._origin.id, {})
+            product.qty_available = values.get('qty_available', 0.0)
+            product.virtual_available = values.get('virtual_available', 0.0)
+            product.free_qty = values.get('free_qty', 0.0)
+            product.incoming_qty = values.get('incoming_qty', 0.0)
+            product.outgoing_qty = values.get('outgoing_qty', 0.0)
+
+    def _ledger_quantities_updated(self):
+        """ Appelé après une mise à jour SQL des quantités par le journal des stocks :
+        synchronise free_qty sur les templates, invalide le cache des seuls produits
+        touchés et déclenche le recalcul des champs qui en dépendent.
+        """
+        if not self:
+            return
+        self.env.cr.execute("""
+            UPDATE product_template t
+               SET free_qty = s.free_qty,
+                   write_date = NOW() AT TIME ZONE 'UTC'
+              FROM (SELECT product_tmpl_id, SUM(COALESCE(free_qty, 0)) AS free_qty
+                      FROM product_product
+                     WHERE active AND product_tmpl_id IN (SELECT product_tmpl_id FROM product_product WHERE id IN %s)
+                  GROUP BY product_tmpl_id) s
+             WHERE t.id = s.product_tmpl_id
+               AND t.free_qty IS DISTINCT FROM s.free_qty
+        """, [tuple(self.ids)])
+        fnames = ['qty_available', 'virtual_available', 'free_qty', 'incoming_qty', 'outgoing_qty']
+        self.invalidate_recordset(fnames)
+        # write_date suit free_qty : les ETag du catalogue (controllers.py) changent avec le stock
+        self.product_tmpl_id.invalidate_recordset(['free_qty', 'write_date'])
+        self.modified(fnames)
+        self._update_preorder_allowed()
+
+    def _update_preorder_allowed(self):
+        """ Met à jour is_preorder_allowed en SQL pour les seuls produits qui franchissent
+        le seuil (ou dont les entrées attendues passent à zéro), sans recalcul Python.
+        """
+        field = self._fields['is_preorder_allowed']
+        self.env.remove_to_compute(field, self)
+        self.env.cr.execute("""
+            UPDATE product_product p
+               SET is_preorder_allowed = NOT COALESCE(p.is_preorder_allowed, FALSE)
+              FROM product_template t
+             WHERE t.id = p.product_tmpl_id
+               AND p.id IN %s
+               AND COALESCE(p.is_preorder_allowed, FALSE) <> (
+                       COALESCE(p.qty_available, 0) <= COALESCE(t.preorder_threshold, 0)
+                   AND COALESCE(p.incoming_qty, 0) > 0)
+         RETURNING p.id
+        """, [tuple(self.ids)])
+        crossed = self.browse(row[0] for row in self.env.cr.fetchall())
+        if crossed:
+            crossed.invalidate_recordset(['is_preorder_allowed'])
+            crossed.modified(['is_preorder_allowed'])
+
     # autorisé la précommande pour le produit
-    is_preorder_allowed = fields.Boolean(string="précommande Autorisée", compute="_compute_is_preorder_allowed")
+    is_preorder_allowed = fields.Boolean(string="précommande Autorisée", compute="_compute_is_preorder_allowed",
+                                         store=True, index=True)
+
+    def _auto_init(self):
+        # Colonne remplie en une requête à l'installation plutôt que par recalcul Python
+        cr = self.env.cr
+        if (not tools.column_exists(cr, 'product_product', 'is_preorder_allowed')
+                and tools.column_exists(cr, 'product_product', 'qty_available')):
+            tools.create_column(cr, 'product_product', 'is_preorder_allowed', 'boolean')
+            cr.execute("""
+                UPDATE product_product p
+                   SET is_preorder_allowed = (COALESCE(p.qty_available, 0) <= COALESCE(t.preorder_threshold, 0)
+                                              AND COALESCE(p.incoming_qty, 0) > 0)
+                  FROM product_template t
+                 WHERE t.id = p.product_tmpl_id
+            """)
+        return super(Product, self)._auto_init()
 
-    @api.depends('qty_available', 'incoming_qty')
+    # Les variations de stock passent par _update_preorder_allowed (journal des stocks)
+    @api.depends('qty_available', 'incoming_qty', 'preorder_threshold')
     def _compute_is_preorder_allowed(self):
         for product in self:
             if product.qty_available <= product.preorder_threshold and product.incoming_qty > 0:
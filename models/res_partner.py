@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import psycopg2
+
 from odoo import fields, models, api, _
 from datetime import datetime
 
+import logging
+
+_logger = logging.getLogger(__name__)
+
 
 class ResPartner(models.Model):
     _inherit = "res.partner"
@@ -54,20 +60,51 @@ class ResPartner(models.Model):
 
 
 
+    def init(self):
+        super(ResPartner, self).init()
+        # Unicité des codes entreprise (les contacts gardent la valeur par défaut "Code")
+        try:
+            with self.env.cr.savepoint():
+                self.env.cr.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS res_partner_entreprise_code_uniq
+                        ON res_partner (entreprise_code)
+                     WHERE is_company AND entreprise_code IS NOT NULL AND entreprise_code != 'Code'
+                """)
+        except psycopg2.IntegrityError:
+            _logger.warning("Codes entreprise en double : index d'unicité res_partner_entreprise_code_uniq non créé")
+
+    @api.model
+    def _init_entreprise_code_sequence(self):
+        """ Place la séquence des codes entreprise après les entreprises existantes.
+
+        Appelée à l'installation et à chaque mise à jour : la séquence n'est jamais reculée.
+        """
+        sequence = self.env.ref('orbit.seq_partner_entreprise_code', raise_if_not_found=False)
+        if not sequence:
+            return
+        number_next = self.with_context(active_test=False).search_count([('is_company', '=', True)]) + 1
+        if number_next > sequence.number_next_actual:
+            sequence.number_next = number_next
+
     @api.model_create_multi
     def create(self, vals_list):
-        """ Méthode pour générer un code unique basé sur le nom, la date de création et le rang de l'entreprise """
-
-        for vals in vals_list:
-            if vals.get('is_company', None):
-                code_date_creation = datetime.now().strftime('%d%m%Y')
-                code_number = self.search_count([('is_company', '=', True)]) + 1
-                code_name = str(vals.get('name')[0:4]).upper()
+        """ Méthode pour générer un code unique basé sur le nom, la date de création et le rang de l'entreprise
+
+        Le rang provient de la séquence res.partner.entreprise.code (sans verrou par défaut,
+        configurable en "sans trou") : pas de COUNT(*) par enregistrement ni de conflit entre
+        créations concurrentes, et tous les enregistrements sont créés en un seul appel.
+        """
+        company_vals_list = [vals for vals in vals_list if vals.get('is_company')]
+        if company_vals_list:
+            code_date_creation = datetime.now().strftime('%d%m%Y')
+            # Séquence résolue une fois pour tout le lot (même règle que next_by_code)
+            sequence = self.env['ir.sequence'].sudo().search([
+                ('code', '=', 'res.partner.entreprise.code'),
+                ('company_id', 'in', [self.env.company.id, False]),
+            ], order='company_id', limit=1)
+            for vals in company_vals_list:
+                code_number = sequence._next() if sequence else False
+                code_name = str(vals.get('name') or '')[0:4].upper()
                 vals['entreprise_code'] = f"{code_name}{code_date_creation}{code_number}"
 
-                return super(ResPartner, self).create(vals)
-            else:
-                return super(ResPartner, self).create(vals)
-        
-    
-
+        return super(ResPartner, self).create(vals_list)
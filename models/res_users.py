@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from odoo import  fields, models, api, _, exceptions
+from odoo import  fields, models, api, tools, _, exceptions
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -27,28 +27,63 @@ class Users(models.Model):
 
         return usrs
     
+    @property
+    def SELF_READABLE_FIELDS(self):
+        return super(Users, self).SELF_READABLE_FIELDS + ['signature_perso', 'can_edit_signature']
+
+    @property
+    def SELF_WRITEABLE_FIELDS(self):
+        return super(Users, self).SELF_WRITEABLE_FIELDS + ['signature_perso']
+
+    @api.depends_context('uid')
+    def _compute_can_edit_signature(self):
+        # Un administrateur modifie toutes les signatures, un utilisateur seulement la sienne
+        is_system = self.env.user._is_system()
+        for usr in self:
+            usr.can_edit_signature = is_system or usr.id == self.env.uid
+
     @api.model
     def fields_get(self, allfields=None, attributes=None):
         res = super(Users, self).fields_get(allfields, attributes)
-        if not self.env.user.has_group('base.group_system'):  # Groupe de Managers
-            if 'signature_perso' in res:
-                res['signature_perso']['readonly'] = True
-            if self.env.user == self:
-                res['signature_perso']['readonly'] = False  # L'utilisateur peut modifier sa propre signature
+        for fname, field_attrs in self._get_fields_get_overlay(tuple(self.env.user.groups_id.ids)):
+            if fname in res:
+                res[fname].update(field_attrs)
         return res
-    
-    def write(self, vals_list):
+
+    @api.model
+    @tools.ormcache('group_ids')
+    def _get_fields_get_overlay(self, group_ids):
+        """ Attributs de champs surchargés selon les groupes de l'utilisateur courant.
+
+        Le résultat ne dépend que des groupes : il est mis en cache et réutilisé à
+        chaque chargement de vue (le cache est vidé par le noyau quand les groupes
+        d'un utilisateur changent).
+        """
+        if self.env.user._is_system():
+            return ()
+        # La modification de sa propre signature est gérée dans la vue (can_edit_signature)
+        return (('signature_perso', {'readonly': True}),)
+
+    def write(self, vals):
         """
-        Else the menu will be still hidden even after removing from the list
+        Les menus masqués sont synchronisés par la table de relation commune avec
+        ir.ui.menu.restrict_user_ids ; seule l'entrée de cache des utilisateurs modifiés
+        est invalidée (via hide_menu_version), pas les caches de tout le registre.
         """
-        usrs = super(Users, self).write(vals_list)
-        for rec in self:
-            for menu in rec.hide_menu_ids:
-                menu.write({
-                    'restrict_user_ids': [(4, rec.id)]
-                })
-        self.clear_caches()
+        usrs = super(Users, self).write(vals)
+        if 'hide_menu_ids' in vals:
+            self._bump_hide_menu_version()
         return usrs
+
+    def _bump_hide_menu_version(self):
+        """ Nouvelle version des menus masqués : change la clé de cache de _hidden_menu_ids
+        et de load_menus pour ces seuls utilisateurs. """
+        if not self:
+            return
+        self.env.cr.execute("""
+            UPDATE res_users SET hide_menu_version = COALESCE(hide_menu_version, 0) + 1 WHERE id IN %s
+        """, [tuple(self.ids)])
+        self.invalidate_recordset(['hide_menu_version'])
     
     def _get_is_admin(self):
         """
@@ -64,8 +99,11 @@ class Users(models.Model):
     
     # main_company, user_root, user_admin, partner_admin
 
-    hide_menu_ids = fields.Many2many('ir.ui.menu', string="Menus", store=True, 
+    hide_menu_ids = fields.Many2many('ir.ui.menu', 'ir_ui_menu_res_users_rel', 'res_users_id', 'ir_ui_menu_id',
+                                     string="Menus", store=True, 
                                      help="Select menu items that needs to be hidden to this user ")
+    hide_menu_version = fields.Integer("Version des menus masqués", default=0, readonly=True, copy=False)
     is_admin = fields.Boolean(string="Est Admin", compute=_get_is_admin)
+    can_edit_signature = fields.Boolean(string="Peut modifier la signature", compute='_compute_can_edit_signature')
     # for users web
     # is_web= fields.Boolean(string="User web ", default=True)
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
-from odoo import fields, models, api, _, tools, SUPERUSER_ID
+from odoo import fields, models, api, _, tools, SUPERUSER_ID, exceptions
+from odoo.tools import split_every
+from odoo.tools.pdf import PdfFileReader, PdfFileWriter
 
 import logging
+import zipfile
 
 _logger = logging.getLogger(__name__)
 
@@ -51,6 +54,26 @@ CREDITORDER_STATE = [
     ('cancel', "Cancelled"),
 ]
 
+# Enregistrements lus par le rapport de commande, chargés en une passe par lot
+REPORT_PREFETCH_PATHS = [
+    'partner_id.name', 'partner_invoice_id.name', 'partner_shipping_id.name',
+    'company_id.account_fiscal_country_id.vat_label', 'fiscal_position_id.note',
+    'payment_term_id.note', 'pricelist_id.currency_id.name', 'user_id.name',
+    'usr_confirmed.signature_perso',
+    'order_line.product_uom.name', 'order_line.tax_id.name',
+]
+
+REPORT_BATCH_FORMATS = ('zip', 'pdf')
+# Le PDF fusionné garde toutes ses pages en mémoire jusqu'à l'écriture : au-delà, ZIP
+REPORT_PDF_MAX_ORDERS = 200
+
+
+def _append_pdf_pages(writer, stream):
+    reader = PdfFileReader(stream, strict=False)
+    for page in range(reader.getNumPages()):
+        writer.addPage(reader.getPage(page))
+
+
 TYPE_SALE = [
     ('order', "Commande"),
     ('preorder', "Precommande"),
@@ -110,4 +133,77 @@ class SaleOrder(models.Model):
                     'state': 'to_delivered'
                 })
 
-                
\ No newline at end of file
+                
+
+    def action_print_report_batch(self, report_format='zip'):
+        """ Impression par lots : ZIP d'un PDF par commande ou PDF fusionné """
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/orbit/sale_order/report/batch?format=%s&ids=%s' % (
+                report_format, ','.join(str(order_id) for order_id in self.ids)),
+            'target': 'self',
+        }
+
+    def _prefetch_report_data(self):
+        """ Charge en une requête par modèle les données lues par le rapport de commande.
+
+        Les noms de produits sont traduits dans la langue du client : ils sont
+        préchargés par langue, comme le rapport les lira.
+        """
+        for path in REPORT_PREFETCH_PATHS:
+            self.mapped(path)
+        for lang in set(self.mapped('partner_id.lang')):
+            orders = self.filtered(lambda order: order.partner_id.lang == lang)
+            orders.with_context(lang=lang).mapped('order_line.product_id.name')
+
+    def _render_report_batch(self, output, report_format='zip', chunk_size=50):
+        """ Écrit le rapport des commandes dans ``output`` (fichier), par lots.
+
+        Chaque lot est préchargé, rendu puis retiré du cache. En ZIP, chaque PDF est
+        écrit dans l'archive dès son rendu : la mémoire ne dépend que de la taille du
+        lot. Le PDF fusionné, lui, conserve toutes les pages jusqu'à l'écriture finale
+        (PdfFileWriter) : il est limité à REPORT_PDF_MAX_ORDERS commandes, les gros
+        lots passent par le ZIP.
+        """
+        if report_format not in REPORT_BATCH_FORMATS:
+            raise ValueError("Format d'impression inconnu : %s" % report_format)
+        if report_format == 'zip':
+            with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for streams in self._render_report_chunks(chunk_size):
+                    for name, stream in streams:
+                        archive.writestr('%s.pdf' % name, stream.getvalue())
+                        stream.close()
+            return
+
+        if len(self) > REPORT_PDF_MAX_ORDERS:
+            raise exceptions.UserError(_(
+                "Le PDF fusionné est limité à %s commandes : utilisez le format ZIP.", REPORT_PDF_MAX_ORDERS))
+        writer = PdfFileWriter()
+        # les pages lues restent liées à leur flux : fermeture après l'écriture
+        opened = []
+        try:
+            for streams in self._render_report_chunks(chunk_size):
+                for name, stream in streams:
+                    opened.append(stream)
+                    _append_pdf_pages(writer, stream)
+            writer.write(output)
+        finally:
+            for stream in opened:
+                stream.close()
+
+    def _render_report_chunks(self, chunk_size):
+        """ Génère, par lot de commandes, la liste des (nom, flux PDF) rendus """
+        report = self.env.ref('sale.action_report_saleorder')
+        Report = self.env['ir.actions.report']
+        for order_ids in split_every(chunk_size, self.ids):
+            orders = self.browse(order_ids)
+            orders._prefetch_report_data()
+            names = {order.id: order.name.replace('/', '_') for order in orders}
+            collected = Report._render_qweb_pdf_prepare_streams(
+                report.report_name, {'report_type': 'pdf'}, res_ids=list(order_ids))
+            yield [
+                # sans découpage possible, le lot est rendu en un seul flux (res_id False)
+                (names.get(res_id) or 'commandes_%s' % order_ids[0], values['stream'])
+                for res_id, values in collected.items()
+            ]
+            self.env.invalidate_all()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, tools
+
+# Préfixes des champs d'échéance de sale.order, dans l'ordre des échéances
+INSTALLMENT_RANKS = ['first', 'second', 'third', 'fourth']
+# Répartition du montant de la commande entre les échéances, par type de vente
+INSTALLMENT_RATES = {
+    'preorder': (0.3, 0.3, 0.4),
+    'creditorder': (0.5, 0.2, 0.15, 0.15),
+}
+# Nombre d'échéances par type de vente
+INSTALLMENT_COUNT = {type_sale: len(rates) for type_sale, rates in INSTALLMENT_RATES.items()}
+
+
+class SaleOrderInstallment(models.Model):
+    """ Une ligne par échéance de paiement d'une précommande ou commande à crédit.
+
+    Les valeurs sont dérivées des champs first_/second_/third_/fourth_payment_* de la
+    commande, conservés pour compatibilité. L'index (state, due_date) permet de
+    répondre aux questions d'échéancier (impayés de la semaine, prévisions
+    d'encaissement, relances) par une simple requête indexée.
+    """
+    _name = 'sale.order.installment'
+    _description = "Échéance de paiement"
+    _order = 'due_date, order_id, sequence'
+    _sql_constraints = [
+        ("order_sequence_uniq", "UNIQUE(order_id, sequence)", "Une commande ne peut avoir qu'une échéance par rang."),
+    ]
+
+    order_id = fields.Many2one('sale.order', string="Commande", required=True, index=True, ondelete='cascade')
+    sequence = fields.Integer("Rang", required=True)
+    partner_id = fields.Many2one(related='order_id.partner_id', string="Client")
+    type_sale = fields.Selection(related='order_id.type_sale', string="Type de vente")
+    currency_id = fields.Many2one(related='order_id.currency_id', string="Devise")
+
+    due_date = fields.Date("Date d'échéance", compute='_compute_installment_data', store=True)
+    amount = fields.Monetary("Montant", compute='_compute_installment_data', store=True)
+    paid_amount = fields.Monetary("Montant payé", compute='_compute_installment_data', store=True)
+    state = fields.Selection([
+        ('unpaid', 'Non payé'),
+        ('partial', 'Partiellement payé'),
+        ('paid', 'Payé'),
+    ], string="État", compute='_compute_installment_data', store=True)
+
+    def _auto_init(self):
+        res = super(SaleOrderInstallment, self)._auto_init()
+        tools.create_index(self._cr, 'sale_order_installment_state_due_date_index',
+                           self._table, ['state', 'due_date'])
+        return res
+
+    @api.depends(
+        'sequence',
+        'order_id.first_payment_date', 'order_id.first_payment_amount', 'order_id.first_payment_state',
+        'order_id.second_payment_date', 'order_id.second_payment_amount', 'order_id.second_payment_state',
+        'order_id.third_payment_date', 'order_id.third_payment_amount', 'order_id.third_payment_state',
+        'order_id.fourth_payment_date', 'order_id.fourth_payment_amount', 'order_id.fourth_payment_state',
+        'order_id.account_payment_ids.state', 'order_id.account_payment_ids.amount',
+    )
+    def _compute_installment_data(self):
+        orders = self.order_id._origin
+        paid_by_order = {}
+        if orders:
+            paid_by_order = {
+                group['sale_id'][0]: group['amount']
+                for group in self.env['account.payment'].read_group(
+                    [('sale_id', 'in', orders.ids), ('state', '=', 'posted')],
+                    ['amount:sum'], ['sale_id'], lazy=False,
+                )
+            }
+        for installment in self:
+            order = installment.order_id
+            ranks = INSTALLMENT_RANKS[:installment.sequence]
+            if not 0 < installment.sequence <= len(INSTALLMENT_RANKS):
+                installment.due_date = False
+                installment.amount = 0.0
+                installment.paid_amount = 0.0
+                installment.state = 'unpaid'
+                continue
+            rank = ranks[-1]
+            amount = order['%s_payment_amount' % rank]
+            # les paiements sont imputés sur les échéances dans l'ordre
+            previous_amount = sum(order['%s_payment_amount' % previous] for previous in ranks[:-1])
+            paid_total = paid_by_order.get(order._origin.id, 0.0)
+            installment.due_date = order['%s_payment_date' % rank]
+            installment.amount = amount
+            installment.paid_amount = min(amount, max(0.0, paid_total - previous_amount))
+            if order['%s_payment_state' % rank]:
+                installment.state = 'paid'
+            elif installment.paid_amount > 0:
+                installment.state = 'partial'
+            else:
+                installment.state = 'unpaid'
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from odoo import fields, models
+
+
+class SaleOrderReminder(models.Model):
+    """ Journal des emails de relance : une relance n'est envoyée qu'une fois
+    par commande, par échéance et par modèle d'email. """
+    _name = 'sale.order.reminder'
+    _description = "Relance de paiement envoyée"
+    _order = "date desc, id desc"
+    _sql_constraints = [
+        ("reminder_uniq", "UNIQUE(order_id, installment, template_id)",
+         "Cette relance a déjà été envoyée pour cette échéance."),
+    ]
+
+    order_id = fields.Many2one('sale.order', string="Commande", required=True, index=True, ondelete='cascade')
+    # 0 pour les commandes standard, 1 à 4 pour les échéances des précommandes/commandes à crédit
+    installment = fields.Integer("Échéance", required=True, default=0)
+    template_id = fields.Many2one('mail.template', string="Modèle d'email", required=True, ondelete='cascade')
+    mail_id = fields.Many2one('mail.mail', string="Email", ondelete='set null')
+    date = fields.Datetime("Date d'envoi", default=fields.Datetime.now, readonly=True)
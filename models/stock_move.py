@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from odoo import api, models
+
+# États pour lesquels un mouvement compte dans les quantités entrantes/sortantes
+LEDGER_MOVE_STATES = ('waiting', 'confirmed', 'partially_available', 'assigned')
+LEDGER_MOVE_FIELDS = {'state', 'product_id', 'product_uom_qty', 'product_uom', 'location_id', 'location_dest_id'}
+
+
+class StockMove(models.Model):
+    _inherit = 'stock.move'
+
+    def _get_ledger_contribution(self):
+        """ Quantités entrantes/sortantes portées par les mouvements : {produit: [entrant, sortant]} """
+        contribution = defaultdict(lambda: [0.0, 0.0])
+        for move in self:
+            if move.state not in LEDGER_MOVE_STATES:
+                continue
+            src_internal = move.location_id.usage == 'internal'
+            dest_internal = move.location_dest_id.usage == 'internal'
+            if dest_internal and not src_internal:
+                contribution[move.product_id][0] += move.product_qty
+            elif src_internal and not dest_internal:
+                contribution[move.product_id][1] += move.product_qty
+        return contribution
+
+    def _push_ledger_contribution(self, before, after):
+        Ledger = self.env['orbit.stock.qty.ledger']
+        for product in set(before) | set(after):
+            incoming_before, outgoing_before = before.get(product, (0.0, 0.0))
+            incoming_after, outgoing_after = after.get(product, (0.0, 0.0))
+            Ledger._push_deltas(
+                product,
+                incoming_qty=incoming_after - incoming_before,
+                outgoing_qty=outgoing_after - outgoing_before,
+            )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        moves = super(StockMove, self).create(vals_list)
+        moves._push_ledger_contribution({}, moves._get_ledger_contribution())
+        return moves
+
+    def write(self, vals):
+        if not LEDGER_MOVE_FIELDS.intersection(vals):
+            return super(StockMove, self).write(vals)
+        before = self._get_ledger_contribution()
+        res = super(StockMove, self).write(vals)
+        self._push_ledger_contribution(before, self._get_ledger_contribution())
+        return res
+
+    def unlink(self):
+        self._push_ledger_contribution(self._get_ledger_contribution(), {})
+        return super(StockMove, self).unlink()
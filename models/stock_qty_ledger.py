@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from psycopg2.extras import execute_values
+
+from odoo import api, fields, models
+from odoo.tools import float_compare, split_every
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Colonnes de product.product tenues à jour par le journal (ordre des deltas)
+LEDGER_FIELDS = ['qty_available', 'free_qty', 'incoming_qty', 'outgoing_qty']
+QTY_FIELDS = LEDGER_FIELDS + ['virtual_available']
+
+
+class StockQtyLedger(models.Model):
+    """ Journal des variations de quantités de stock.
+
+    Les mouvements et quants n'écrivent plus directement sur product.product : ils
+    ajoutent des incréments signés (INSERT sans verrou sur les produits), appliqués
+    ensuite par lots par une tâche planifiée. Une seconde tâche réconcilie les
+    quantités stockées avec le calcul de référence du module stock.
+    """
+    _name = 'orbit.stock.qty.ledger'
+    _description = "Journal des variations de stock"
+    _log_access = False
+
+    product_id = fields.Many2one('product.product', string="Produit", required=True, index=True, ondelete='cascade')
+    qty_available = fields.Float("Delta quantité disponible", digits='Product Unit of Measure', default=0.0)
+    free_qty = fields.Float("Delta quantité libre", digits='Product Unit of Measure', default=0.0)
+    incoming_qty = fields.Float("Delta quantité entrante", digits='Product Unit of Measure', default=0.0)
+    outgoing_qty = fields.Float("Delta quantité sortante", digits='Product Unit of Measure', default=0.0)
+
+    @api.model
+    def _push_deltas(self, product, qty_available=0.0, free_qty=0.0, incoming_qty=0.0, outgoing_qty=0.0):
+        """ Cumule un incrément signé pour un produit.
+
+        Les incréments sont agrégés par produit pendant la transaction et insérés en
+        une seule requête au moment du commit.
+        """
+        if not (qty_available or free_qty or incoming_qty or outgoing_qty):
+            return
+        data = self.env.cr.precommit.data
+        deltas = data.get(self._name)
+        if deltas is None:
+            deltas = data[self._name] = defaultdict(lambda: [0.0] * len(LEDGER_FIELDS))
+            self.env.cr.precommit.add(self._flush_deltas)
+        delta = deltas[product.id]
+        delta[0] += qty_available
+        delta[1] += free_qty
+        delta[2] += incoming_qty
+        delta[3] += outgoing_qty
+
+    def _flush_deltas(self):
+        deltas = self.env.cr.precommit.data.pop(self._name, {})
+        rows = [(product_id, *delta) for product_id, delta in deltas.items() if any(delta)]
+        if rows:
+            execute_values(self.env.cr._obj, """
+                INSERT INTO orbit_stock_qty_ledger (product_id, qty_available, free_qty, incoming_qty, outgoing_qty)
+                VALUES %s
+            """, rows)
+
+    @api.model
+    def _apply_pending(self, batch_size=10000):
+        """ Applique un lot d'incréments en attente, retourne les produits modifiés """
+        self.env.cr.execute("""
+            WITH pending AS (
+                DELETE FROM orbit_stock_qty_ledger
+                 WHERE id IN (SELECT id FROM orbit_stock_qty_ledger
+                               ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED)
+             RETURNING product_id, qty_available, free_qty, incoming_qty, outgoing_qty
+            ), totals AS (
+                SELECT product_id,
+                       SUM(qty_available) AS qty_available, SUM(free_qty) AS free_qty,
+                       SUM(incoming_qty) AS incoming_qty, SUM(outgoing_qty) AS outgoing_qty
+                  FROM pending
+              GROUP BY product_id
+            )
+            UPDATE product_product p
+               SET qty_available = COALESCE(p.qty_available, 0) + t.qty_available,
+                   free_qty = COALESCE(p.free_qty, 0) + t.free_qty,
+                   incoming_qty = COALESCE(p.incoming_qty, 0) + t.incoming_qty,
+                   outgoing_qty = COALESCE(p.outgoing_qty, 0) + t.outgoing_qty,
+                   virtual_available = COALESCE(p.virtual_available, 0)
+                                       + t.qty_available + t.incoming_qty - t.outgoing_qty
+              FROM totals t
+             WHERE p.id = t.product_id
+         RETURNING p.id
+        """, [batch_size])
+        products = self.env['product.product'].browse(row[0] for row in self.env.cr.fetchall())
+        products._ledger_quantities_updated()
+        return products
+
+    @api.model
+    def _cron_apply_pending(self, batch_size=10000):
+        """ Tâche planifiée : applique tous les incréments en attente, par lots """
+        while self._apply_pending(batch_size):
+            self.env.flush_all()
+            self._cr.commit()
+
+    @api.model
+    def _cron_reconcile(self, batch_size=1000):
+        """ Tâche planifiée : compare les quantités stockées au calcul de référence du stock.
+
+        Les écarts (mouvements modifiés hors ORM, corrections manuelles...) sont
+        corrigés et journalisés.
+        """
+        self._cron_apply_pending()
+        Product = self.env['product.product'].with_context(
+            active_test=False,
+            allowed_company_ids=self.env['res.company'].sudo().search([]).ids,
+        )
+        digits = self.env['decimal.precision'].precision_get('Product Unit of Measure')
+        drift_count = 0
+        for product_ids in split_every(batch_size, Product.search([]).ids):
+            products = Product.browse(product_ids)
+            expected = products._compute_quantities_dict(None, None, None)
+            self.env.cr.execute("""
+                SELECT id, qty_available, free_qty, incoming_qty, outgoing_qty, virtual_available
+                  FROM product_product WHERE id IN %s
+            """, [tuple(product_ids)])
+            rows = []
+            for product_id, *stored in self.env.cr.fetchall():
+                reference = [expected[product_id][fname] for fname in QTY_FIELDS]
+                if any(float_compare(value or 0.0, ref, precision_digits=digits)
+                       for value, ref in zip(stored, reference)):
+                    rows.append((product_id, *reference))
+            if rows:
+                drift_count += len(rows)
+                execute_values(self.env.cr._obj, """
+                    UPDATE product_product p
+                       SET qty_available = v.qty_available, free_qty = v.free_qty,
+                           incoming_qty = v.incoming_qty, outgoing_qty = v.outgoing_qty,
+                           virtual_available = v.virtual_available
+                      FROM (VALUES %s) AS v(id, qty_available, free_qty, incoming_qty, outgoing_qty, virtual_available)
+                     WHERE p.id = v.id
+                """, rows)
+                Product.browse(row[0] for row in rows)._ledger_quantities_updated()
+                self.env.flush_all()
+            self._cr.commit()
+        if drift_count:
+            _logger.warning("Réconciliation du stock : %s produit(s) corrigé(s)", drift_count)
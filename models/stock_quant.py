@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+
+class StockQuant(models.Model):
+    _inherit = 'stock.quant'
+
+    @api.model
+    def _update_available_quantity(self, product_id, location_id, quantity, *args, **kwargs):
+        res = super(StockQuant, self)._update_available_quantity(product_id, location_id, quantity, *args, **kwargs)
+        if location_id.usage == 'internal':
+            self.env['orbit.stock.qty.ledger']._push_deltas(product_id, qty_available=quantity, free_qty=quantity)
+        return res
+
+    @api.model
+    def _update_reserved_quantity(self, product_id, location_id, quantity, *args, **kwargs):
+        reserved_quants = super(StockQuant, self)._update_reserved_quantity(product_id, location_id, quantity, *args, **kwargs)
+        # la réservation peut porter sur des quants situés dans des emplacements enfants
+        reserved = sum(qty for quant, qty in reserved_quants if quant.location_id.usage == 'internal')
+        self.env['orbit.stock.qty.ledger']._push_deltas(product_id, free_qty=-reserved)
+        return reserved_quants
@@ -9,7 +9,7 @@ class Comment(models.Model):
     author = fields.Char(string='Author')
     text = fields.Text(string='Text')
     date = fields.Datetime(string="Date d'envoie", default=fields.Datetime.now)
-    product_id = fields.Many2one('product.template', string='Product')
+    product_id = fields.Many2one('product.template', string='Product', index=True)
     review = fields.Integer(string='Review' , default=0)
     
     
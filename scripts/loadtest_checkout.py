@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Test de charge du parcours de vente orbit via l'API JSON-RPC d'une instance locale.
+
+Plusieurs processus enchaînent en parallèle des parcours commande / précommande /
+commande à crédit (devis, confirmation, paiement d'échéance, livraison) et mesurent
+chaque étape. Le rapport donne, par étape, les percentiles de latence, le taux
+d'erreurs et le taux d'échecs de sérialisation PostgreSQL, ainsi que le débit de
+confirmations. Avec --capacity-product, on vérifie en fin de test qu'aucune
+précommande n'a dépassé preorder_quantity_allow.
+
+Uniquement la bibliothèque standard :
+
+    python3 scripts/loadtest_checkout.py --db orbit --login admin --password admin \\
+        --processes 8 --iterations 50 --mix order=2,preorder=5,creditorder=1 --report loadtest.json
+"""
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+STEPS = ['quote', 'validate', 'confirm', 'pay_installment', 'deliver']
+SERIALIZATION_MARKERS = (
+    'could not serialize access', 'concurrent update', 'SerializationFailure', 'deadlock detected',
+)
+CAPACITY_MARKER = 'capacité de précommande'
+
+
+class RpcError(Exception):
+
+    def __init__(self, error):
+        data = error.get('data') or {}
+        self.message = data.get('message') or error.get('message') or str(error)
+        self.name = data.get('name', '')
+        super(RpcError, self).__init__(self.message)
+
+    @property
+    def kind(self):
+        text = '%s %s' % (self.name, self.message)
+        if any(marker in text for marker in SERIALIZATION_MARKERS):
+            return 'serialization'
+        if CAPACITY_MARKER in text:
+            return 'capacity'
+        return 'error'
+
+
+class OdooClient(object):
+    """ Client JSON-RPC minimal (service object / execute_kw) """
+
+    def __init__(self, url, db, login, password, timeout=120):
+        self.url = url.rstrip('/') + '/jsonrpc'
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self.uid = self._call('common', 'login', db, login, password)
+        if not self.uid:
+            raise SystemExit("Authentification refusée pour %s" % login)
+
+    def _call(self, service, method, *args):
+        payload = json.dumps({
+            'jsonrpc': '2.0', 'method': 'call', 'id': next(self._ids),
+            'params': {'service': service, 'method': method, 'args': args},
+        }).encode()
+        req = urllib.request.Request(self.url, payload, {'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            result = json.loads(response.read())
+        if result.get('error'):
+            raise RpcError(result['error'])
+        return result.get('result')
+
+    def execute(self, model, method, *args, **kwargs):
+        return self._call('object', 'execute_kw', self.db, self.uid, self.password, model, method, list(args), kwargs)
+
+
+# --------------------------------------------------------------------------- Scénarios
+
+def _quote(client, options, type_sale):
+    lines = [(0, 0, {'product_id': product_id, 'product_uom_qty': options.quantity})
+             for product_id in random.sample(options.product_ids, min(options.lines, len(options.product_ids)))]
+    if type_sale == 'preorder' and options.capacity_product:
+        lines[0] = (0, 0, {'product_id': options.capacity_product, 'product_uom_qty': options.quantity})
+    values = {'partner_id': random.choice(options.partner_ids), 'type_sale': type_sale, 'order_line': lines}
+    if type_sale == 'preorder':
+        values['commitment_date'] = time.strftime('%Y-%m-%d', time.localtime(time.time() + 60 * 86400))
+    return client.execute('sale.order', 'create', values, context={'default_type_sale': type_sale})
+
+
+def _pay(client, options, order_id, amount_field='first_payment_amount'):
+    order = client.execute('sale.order', 'read', [order_id], [amount_field, 'amount_residual'])[0]
+    amount = order[amount_field] or order['amount_residual']
+    if amount <= 0:
+        return
+    context = {'active_id': order_id, 'active_ids': [order_id], 'active_model': 'sale.order'}
+    wizard_id = client.execute('account.voucher.wizard', 'create', {
+        'order_id': order_id, 'journal_id': options.journal_id, 'amount_advance': amount,
+    }, context=context)
+    client.execute('account.voucher.wizard', 'make_advance_payment', [wizard_id], context=context)
+
+
+def run_scenario(client, options, type_sale, timed):
+    """ Enchaîne les étapes d'un parcours ; ``timed(step, fn)`` mesure chaque étape """
+    order_id = timed('quote', lambda: _quote(client, options, type_sale))
+    if type_sale == 'creditorder':
+        # validations RH / administrateur puis premier acompte avant confirmation
+        timed('validate', lambda: (client.execute('sale.order', 'validate_rh', [order_id]),
+                                   client.execute('sale.order', 'approved_responsable', [order_id])))
+        timed('pay_installment', lambda: _pay(client, options, order_id))
+        timed('confirm', lambda: client.execute('sale.order', 'action_confirm', [order_id]))
+    else:
+        timed('confirm', lambda: client.execute('sale.order', 'action_confirm', [order_id]))
+        amount_field = 'first_payment_amount' if type_sale == 'preorder' else 'amount_residual'
+        timed('pay_installment', lambda: _pay(client, options, order_id, amount_field))
+    if type_sale == 'order':
+        timed('deliver', lambda: client.execute('sale.order', 'action_to_delivered', [order_id]))
+
+
+def worker(args):
+    """ Un processus : ``iterations`` parcours tirés selon le mix, échantillons retournés """
+    options, seed = args
+    random.seed(seed)
+    client = OdooClient(options.url, options.db, options.login, options.password)
+    mix = [type_sale for type_sale, weight in options.mix.items() for _i in range(weight)]
+    samples = []
+
+    def timed(step, fn):
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except RpcError as error:
+            samples.append((step, time.perf_counter() - start, error.kind))
+            raise
+        except OSError:
+            samples.append((step, time.perf_counter() - start, 'network'))
+            raise
+        samples.append((step, time.perf_counter() - start, 'ok'))
+        return result
+
+    for _iteration in range(options.iterations):
+        try:
+            run_scenario(client, options, random.choice(mix), timed)
+        except (RpcError, OSError):
+            continue  # parcours abandonné, l'échec est déjà compté sur son étape
+    return samples
+
+
+# ---------------------------------------------------------------------------- Rapport
+
+def percentile(values, rank):
+    """ Percentile au rang le plus proche, ``values`` triées """
+    if not values:
+        return None
+    index = max(math.ceil(rank / 100.0 * len(values)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def build_report(samples, elapsed):
+    by_step = defaultdict(list)
+    for step, duration, outcome in samples:
+        by_step[step].append((duration, outcome))
+    steps = {}
+    for step in STEPS:
+        entries = by_step.get(step)
+        if not entries:
+            continue
+        durations = sorted(duration for duration, outcome in entries if outcome == 'ok')
+        outcomes = defaultdict(int)
+        for _duration, outcome in entries:
+            outcomes[outcome] += 1
+        total = len(entries)
+        steps[step] = {
+            'count': total,
+            'ok': outcomes['ok'],
+            'p50_ms': _ms(percentile(durations, 50)),
+            'p90_ms': _ms(percentile(durations, 90)),
+            'p99_ms': _ms(percentile(durations, 99)),
+            'max_ms': _ms(durations[-1] if durations else None),
+            'error_rate': round(outcomes['error'] / total, 4),
+            'serialization_failure_rate': round(outcomes['serialization'] / total, 4),
+            'capacity_rejections': outcomes['capacity'],
+            'network_errors': outcomes['network'],
+        }
+    confirmed = steps.get('confirm', {}).get('ok', 0)
+    return {
+        'elapsed_s': round(elapsed, 2),
+        'confirmations_per_s': round(confirmed / elapsed, 2) if elapsed else None,
+        'steps': steps,
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def check_capacity(client, template_id):
+    """ Vérifie qu'aucune vente n'a dépassé la capacité de précommande du produit """
+    template = client.execute('product.template', 'read', [template_id], ['name', 'preorder_quantity_allow'])[0]
+    reservations = client.execute('sale.order.preorder.reservation', 'search_read',
+                                  [('product_tmpl_id', '=', template_id)], ['quantity'])
+    reserved = sum(reservation['quantity'] for reservation in reservations)
+    allowed = template['preorder_quantity_allow']
+    return {
+        'product': template['name'],
+        'allowed': allowed,
+        'reserved': reserved,
+        'oversold': bool(allowed) and reserved > allowed,
+    }
+
+
+# ------------------------------------------------------------------------------- Main
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='http://localhost:8069')
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--login', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--processes', type=int, default=4, help="processus clients simultanés")
+    parser.add_argument('--iterations', type=int, default=20, help="parcours par processus")
+    parser.add_argument('--mix', default='order=1,preorder=1,creditorder=1',
+                        help="poids des types de vente, ex. order=2,preorder=5,creditorder=1")
+    parser.add_argument('--lines', type=int, default=3, help="lignes par commande")
+    parser.add_argument('--quantity', type=float, default=1.0, help="quantité par ligne")
+    parser.add_argument('--journal-id', type=int, help="journal de paiement (défaut : premier journal de banque)")
+    parser.add_argument('--capacity-product', type=int,
+                        help="product.product inclus dans chaque précommande pour le contrôle de survente")
+    parser.add_argument('--report', help="fichier JSON du rapport")
+    options = parser.parse_args(argv)
+    options.mix = {
+        key.strip(): int(value)
+        for key, value in (item.split('=') for item in options.mix.split(',') if item)
+    }
+    return options
+
+
+def prepare(options):
+    """ Données de référence lues une fois : produits, clients, journal """
+    client = OdooClient(options.url, options.db, options.login, options.password)
+    options.product_ids = client.execute('product.product', 'search', [('sale_ok', '=', True)], limit=200)
+    options.partner_ids = client.execute('res.partner', 'search', [('customer_rank', '>', 0)], limit=200) \
+        or client.execute('res.partner', 'search', [('is_company', '=', True)], limit=200)
+    if not options.journal_id:
+        options.journal_id = client.execute('account.journal', 'search', [('type', '=', 'bank')], limit=1)[0]
+    if not (options.product_ids and options.partner_ids):
+        raise SystemExit("Il faut des produits vendables et des clients dans la base")
+    return client
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    client = prepare(options)
+    capacity_template = None
+    if options.capacity_product:
+        capacity_template = client.execute('product.product', 'read', [options.capacity_product],
+                                           ['product_tmpl_id'])[0]['product_tmpl_id'][0]
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(options.processes) as pool:
+        results = pool.map(worker, [(options, seed) for seed in range(options.processes)])
+    elapsed = time.perf_counter() - start
+
+    report = build_report([sample for samples in results for sample in samples], elapsed)
+    report['processes'] = options.processes
+    report['mix'] = options.mix
+    if capacity_template:
+        report['capacity'] = check_capacity(client, capacity_template)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if options.report:
+        with open(options.report, 'w') as report_file:
+            report_file.write(output)
+    return 1 if report.get('capacity', {}).get('oversold') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
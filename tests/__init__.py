@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+from . import test_menu_hiding
+from . import test_performance
+from . import test_reminder_emails
+from . import test_sale_order_report
+from . import test_statement_import
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from odoo import fields
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+# Facteur appliqué aux volumes de données (ORBIT_PERF_SCALE=0.1 pour un essai rapide)
+PERF_SCALE = float(os.environ.get('ORBIT_PERF_SCALE', '1'))
+# Fichier JSON où ajouter les mesures de l'exécution (rapport comparable d'une exécution à l'autre)
+PERF_REPORT = os.environ.get('ORBIT_PERF_REPORT')
+
+
+def scaled(count):
+    return max(int(count * PERF_SCALE), 1)
+
+
+class OrbitPerformanceCase(AccountTestInvoicingCommon):
+    """ Jeu de données volumineux partagé par les tests de performance.
+
+    Crée des milliers de produits, des précommandes confirmées (échéances et factures
+    d'acompte) et leurs paiements, puis mesure nombre de requêtes et durée des chemins
+    critiques. Chaque mesure est conservée pour le rapport JSON.
+    """
+    PRODUCT_COUNT = scaled(2000)
+    PREORDER_COUNT = scaled(200)
+    LINES_PER_ORDER = 3
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super(OrbitPerformanceCase, cls).setUpClass(chart_template_ref=chart_template_ref)
+        cls.measures = []
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True, mail_notrack=True))
+
+        cls.partners = cls.env['res.partner'].create([
+            {'name': 'Client perf %s' % index, 'ninea': 'NINEA%05d' % index}
+            for index in range(scaled(50))
+        ])
+        cls.products = cls.env['product.product'].create([{
+            'name': 'Produit perf %s' % index,
+            'type': 'product',
+            'list_price': 1000.0 + index,
+            'standard_price': 800.0,
+            'is_preorder': True,
+            'preorder_threshold': 5,
+        } for index in range(cls.PRODUCT_COUNT)])
+        cls.bank_journal = cls.company_data['default_journal_bank']
+
+        cls.preorders = cls._create_preorders(cls.PREORDER_COUNT)
+        cls.preorders.action_confirm()
+        cls.payments = cls._create_payments(cls.preorders)
+        # Un acompte en devise étrangère, converti au taux du jour dans la devise de la commande
+        cls.foreign_payment = cls.env['account.payment'].create({
+            'amount': 300.0,
+            'currency_id': cls.currency_data['currency'].id,
+            'payment_type': 'inbound',
+            'partner_type': 'customer',
+            'partner_id': cls.preorders[0].partner_id.commercial_partner_id.id,
+            'journal_id': cls.bank_journal.id,
+            'sale_id': cls.preorders[0].id,
+        })
+        cls.foreign_payment.action_post()
+        cls.env.flush_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        if PERF_REPORT and cls.measures:
+            report = []
+            if os.path.exists(PERF_REPORT):
+                with open(PERF_REPORT) as report_file:
+                    report = json.load(report_file)
+            report.append({
+                'suite': cls.__name__,
+                'date': fields.Datetime.to_string(fields.Datetime.now()),
+                'scale': PERF_SCALE,
+                'measures': cls.measures,
+            })
+            with open(PERF_REPORT, 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+        super(OrbitPerformanceCase, cls).tearDownClass()
+
+    @classmethod
+    def _create_preorders(cls, count, type_sale='preorder'):
+        today = fields.Date.today()
+        return cls.env['sale.order'].with_context(default_type_sale=type_sale).create([{
+            'partner_id': cls.partners[index % len(cls.partners)].id,
+            'type_sale': type_sale,
+            'commitment_date': today + timedelta(days=60),
+            'order_line': [(0, 0, {
+                'product_id': cls.products[(index * cls.LINES_PER_ORDER + line) % len(cls.products)].id,
+                'product_uom_qty': 1 + line,
+            }) for line in range(cls.LINES_PER_ORDER)],
+        } for index in range(count)])
+
+    @classmethod
+    def _create_payments(cls, orders):
+        payments = cls.env['account.payment'].create([{
+            'amount': order.first_payment_amount or order.amount_total * 0.3,
+            'payment_type': 'inbound',
+            'partner_type': 'customer',
+            'partner_id': order.partner_id.commercial_partner_id.id,
+            'journal_id': cls.bank_journal.id,
+            'sale_id': order.id,
+        } for order in orders])
+        payments.action_post()
+        return payments
+
+    @contextmanager
+    def assertBudget(self, name, max_queries, max_seconds=None, records=None):
+        """ Comme assertQueryCount, avec un budget de durée et l'ajout au rapport JSON.
+
+        Le cache est vidé avant la mesure pour compter les lectures réelles. Avec
+        max_queries à None, la mesure est seulement enregistrée.
+        """
+        self.env.flush_all()
+        self.env.invalidate_all()
+        queries_before = self.cr.sql_log_count
+        start = time.perf_counter()
+        yield
+        self.env.flush_all()
+        elapsed = time.perf_counter() - start
+        queries = self.cr.sql_log_count - queries_before
+        self.measures.append({
+            'name': name,
+            'queries': queries,
+            'max_queries': max_queries,
+            'seconds': round(elapsed, 4),
+            'max_seconds': max_seconds,
+            'records': records,
+        })
+        if max_queries is not None:
+            self.assertLessEqual(queries, max_queries, "%s : %s requêtes pour un budget de %s" % (
+                name, queries, max_queries))
+        if max_seconds is not None:
+            self.assertLessEqual(elapsed, max_seconds, "%s : %.2fs pour un budget de %ss" % (
+                name, elapsed, max_seconds))
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+from odoo.addons.orbit.models.ir_ui_menu import RestrictMenu
+
+
+@tagged('post_install', '-at_install')
+class TestMenuHiding(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestMenuHiding, cls).setUpClass()
+        cls.user = new_test_user(cls.env, login='orbit_menu_user', groups='base.group_user')
+        cls.other_user = new_test_user(cls.env, login='orbit_menu_other', groups='base.group_user')
+        action = cls.env['ir.actions.client'].create({'name': 'Orbit test', 'tag': 'orbit_test'})
+        cls.menu = cls.env['ir.ui.menu'].create({
+            'name': 'Orbit menu test',
+            'action': 'ir.actions.client,%s' % action.id,
+        })
+
+    def _load_menus(self, user=None):
+        return self.env['ir.ui.menu'].with_user(user or self.user).load_menus(debug=False)
+
+    def _is_cached(self, user):
+        menus = self.env['ir.ui.menu'].with_user(user)
+        cache = RestrictMenu.load_menus.__cache__
+        entries, key, _counter = cache.lru(menus)
+        return key + cache.key(menus, False) in entries
+
+    def test_hide_menu_refreshes_load_menus(self):
+        self.assertIn(self.menu.id, self._load_menus())
+
+        self.user.write({'hide_menu_ids': [(4, self.menu.id)]})
+        self.assertNotIn(self.menu.id, self._load_menus())
+
+        self.menu.write({'restrict_user_ids': [(3, self.user.id)]})
+        self.assertIn(self.menu.id, self._load_menus())
+
+    def test_hide_menu_keeps_other_users_cache(self):
+        self._load_menus()
+        self._load_menus(self.other_user)
+        self.assertTrue(self._is_cached(self.other_user))
+
+        self.user.write({'hide_menu_ids': [(4, self.menu.id)]})
+        self.assertFalse(self._is_cached(self.user))
+        self.assertTrue(self._is_cached(self.other_user))
+        self.assertIn(self.menu.id, self._load_menus(self.other_user))
+        self.assertNotIn(self.menu.id, self._load_menus())
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import time
+
+from odoo import fields
+from odoo.exceptions import UserError
+from odoo.tests import new_test_user, tagged
+from odoo.tools import float_compare
+
+from odoo.addons.orbit.models.sale_order_installment import INSTALLMENT_COUNT, INSTALLMENT_RANKS
+
+from .common import OrbitPerformanceCase, scaled
+
+
+@tagged('post_install', '-at_install', 'orbit_perf')
+class TestOrbitPerformance(OrbitPerformanceCase):
+    """ Budgets de requêtes des chemins critiques : indépendants du volume traité """
+    # Confirmation des précommandes : coût par facture d'acompte et part fixe
+    ACTION_CONFIRM_PER_INVOICE = 20
+    ACTION_CONFIRM_FIXED = 300
+
+    def _reference_advance_payment(self, order):
+        """ Calcul d'origine, commande par commande (lignes filtrées, res.currency._convert) """
+        payment_lines = order.account_payment_ids.mapped('move_id.line_ids').filtered(
+            lambda line: line.account_id.account_type == 'asset_receivable' and line.parent_state == 'posted'
+        )
+        advance_amount = 0.0
+        for line in payment_lines:
+            line_currency = line.currency_id or line.company_id.currency_id
+            line_amount = -(line.amount_residual_currency if line.currency_id else line.amount_residual)
+            if line_currency != order.currency_id:
+                line_amount = line_currency._convert(line_amount, order.currency_id, order.company_id,
+                                                     line.date or fields.Date.context_today(order))
+            advance_amount += line_amount
+        invoice_paid_amount = sum(
+            invoice.amount_total - invoice.amount_residual
+            for invoice in order.invoice_ids if invoice.move_type in ('out_invoice', 'out_refund')
+        )
+        residual = order.amount_total - advance_amount - invoice_paid_amount
+        if not (payment_lines or order.invoice_ids):
+            return residual, 'not_paid'
+        paid = float_compare(residual, 0.0, precision_rounding=order.currency_id.rounding) <= 0
+        return residual, 'paid' if paid else 'partial'
+
+    def test_compute_advance_payment(self):
+        orders = self.preorders
+        with self.assertBudget('compute_advance_payment', max_queries=25, max_seconds=10, records=len(orders)):
+            orders._compute_advance_payment()
+        batched = {order.id: (order.amount_residual, order.advance_payment_status) for order in orders}
+
+        # Même résultat que le calcul d'origine, y compris pour l'acompte en devise étrangère
+        foreign_order = self.preorders[0]
+        self.assertIn(self.foreign_payment.move_id, foreign_order.payment_line_ids.move_id)
+        self.env.invalidate_all()
+        for order in orders[:20]:
+            residual, status = batched[order.id]
+            expected_residual, expected_status = self._reference_advance_payment(order)
+            self.assertEqual(float_compare(residual, expected_residual, precision_digits=2), 0,
+                             "%s : %s au lieu de %s" % (order.name, residual, expected_residual))
+            self.assertEqual(status, expected_status)
+
+    def test_compute_order_data(self):
+        orders = self.preorders
+        with self.assertBudget('compute_order_data', max_queries=20, max_seconds=5, records=len(orders)):
+            orders._compute_order_data()
+
+    def test_compute_preordered_qty(self):
+        templates = self.products.product_tmpl_id
+        with self.assertBudget('compute_sale_reserved_qty', max_queries=8, max_seconds=5, records=len(templates)):
+            templates._compute_sale_reserved_qty()
+        ordered = sum(self.preorders.order_line.mapped('product_uom_qty'))
+        self.assertAlmostEqual(sum(templates.mapped('preordered_qty')), ordered)
+
+    def test_action_confirm(self):
+        # La numérotation des factures d'acompte a un coût par pièce : mesuré sur deux volumes,
+        # il doit rester sous ACTION_CONFIRM_PER_INVOICE, le reste sous un budget fixe
+        small = self._create_preorders(scaled(10))
+        large = self._create_preorders(scaled(10) + scaled(40))
+        with self.assertBudget('action_confirm_preorders_small', max_queries=None, records=len(small)):
+            small.action_confirm()
+        small_queries = self.measures[-1]['queries']
+        with self.assertBudget('action_confirm_preorders', max_queries=None, max_seconds=60, records=len(large)):
+            large.action_confirm()
+        large_queries = self.measures[-1]['queries']
+
+        count = INSTALLMENT_COUNT['preorder']
+        self.assertEqual(len(small.invoice_ids), count * len(small))
+        self.assertEqual(len(large.invoice_ids), count * len(large))
+        per_invoice = (large_queries - small_queries) / (count * (len(large) - len(small)))
+        fixed = small_queries - per_invoice * count * len(small)
+        self.measures.append({'name': 'action_confirm_per_invoice', 'queries': round(per_invoice, 2),
+                              'max_queries': self.ACTION_CONFIRM_PER_INVOICE})
+        self.assertLessEqual(per_invoice, self.ACTION_CONFIRM_PER_INVOICE)
+        self.assertLessEqual(fixed, self.ACTION_CONFIRM_FIXED)
+
+        # Une facture par échéance, au montant de l'échéance
+        ranks = INSTALLMENT_RANKS[:count]
+        for order in large[:20]:
+            invoices = order.invoice_ids.sorted(lambda invoice: (invoice.invoice_date_due, invoice.id))
+            amounts = [
+                sum(invoice.invoice_line_ids.filtered(lambda line: line.display_type == 'product').mapped('price_unit'))
+                for invoice in invoices
+            ]
+            expected = [order['%s_payment_amount' % rank] for rank in ranks]
+            for amount, expected_amount in zip(amounts, expected):
+                self.assertEqual(float_compare(amount, expected_amount, precision_digits=2), 0,
+                                 "%s : %s au lieu de %s" % (order.name, amounts, expected))
+            self.assertEqual(len(amounts), count)
+
+    def test_cron_due_orders(self):
+        with self.assertBudget('cron_due_orders', max_queries=40, max_seconds=10, records=len(self.preorders)):
+            self.env['sale.order'].cron_due_orders()
+
+    def test_cron_stock_ledger(self):
+        Ledger = self.env['orbit.stock.qty.ledger']
+        for product in self.products[:500]:
+            Ledger._push_deltas(product, qty_available=1.0, free_qty=1.0)
+        Ledger._flush_deltas()
+        with self.assertBudget('ledger_apply_pending', max_queries=15, max_seconds=5, records=500):
+            Ledger._apply_pending()
+        self.assertEqual(self.products[0].qty_available, 1.0)
+
+    def test_cron_update_image_count(self):
+        with self.assertBudget('cron_update_image_count', max_queries=10, max_seconds=5,
+                               records=len(self.products)):
+            self.env['product.template'].cron_update_image_count()
+
+    def test_fields_get_non_admin(self):
+        user = new_test_user(self.env, login='orbit_perf_user', groups='base.group_user,sales_team.group_sale_salesman')
+        Users = self.env['res.users'].with_user(user)
+        Users.fields_get()  # remplit le cache des attributs
+
+        with self.assertBudget('fields_get_res_users', max_queries=2, max_seconds=2, records=100):
+            for _index in range(100):
+                description = Users.fields_get()
+        self.assertTrue(description['signature_perso']['readonly'])
+
+        start = time.perf_counter()
+        Users.fields_get()
+        self.measures.append({
+            'name': 'fields_get_res_users_single',
+            'seconds': round(time.perf_counter() - start, 6),
+        })
+
+    def test_preorder_capacity(self):
+        # Deux précommandes de 6 unités pour une capacité de 6 : la seconde est refusée
+        # tant que la première n'est pas annulée
+        product = self.products[0]
+        product.product_tmpl_id.preorder_quantity_allow = 6
+        first, second = self._create_preorders(2)
+        (first | second).order_line.write({'product_id': product.id, 'product_uom_qty': 2})
+        first.action_confirm()
+        with self.assertRaises(UserError):
+            second.action_confirm()
+        first._action_cancel()
+        second.action_confirm()
+        self.assertIn(second.state, ('sale', 'to_delivered'))
+
+    def test_preorder_capacity_backfill(self):
+        # Précommande confirmée avant la création des compteurs : la reprise la compte
+        product = self.products[1]
+        first, second = self._create_preorders(2)
+        (first | second).order_line.write({'product_id': product.id, 'product_uom_qty': 2})
+        first.action_confirm()
+        product.product_tmpl_id.preorder_quantity_allow = 6
+        self.env.flush_all()
+        self.cr.execute("DELETE FROM sale_order_preorder_reservation WHERE order_id = %s", [first.id])
+        self.cr.execute("DELETE FROM product_preorder_capacity WHERE product_tmpl_id = %s",
+                        [product.product_tmpl_id.id])
+        self.env.invalidate_all()
+
+        self.env['sale.order.preorder.reservation'].init()
+        capacity = self.env['product.preorder.capacity'].search([('product_tmpl_id', '=', product.product_tmpl_id.id)])
+        self.assertEqual(capacity.reserved_qty, 6)
+        with self.assertRaises(UserError):
+            second.action_confirm()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import base64
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.tests import tagged
+
+
+@tagged('post_install', '-at_install')
+class TestReminderEmails(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super(TestReminderEmails, cls).setUpClass(chart_template_ref=chart_template_ref)
+        cls.order = cls.env['sale.order'].create({
+            'partner_id': cls.partner_a.id,
+            'order_line': [(0, 0, {'product_id': cls.product_a.id, 'product_uom_qty': 1})],
+        })
+        cls.static_attachment = cls.env['ir.attachment'].create({
+            'name': 'conditions.txt',
+            'datas': base64.b64encode(b'Conditions de vente'),
+        })
+        cls.template = cls.env['mail.template'].create({
+            'name': 'Relance avec rapport',
+            'model_id': cls.env['ir.model']._get_id('sale.order'),
+            'subject': 'Relance {{ object.name }}',
+            'body_html': '<p>Échéance à régler</p>',
+            'partner_to': '{{ object.partner_id.id }}',
+            'report_template': cls.env.ref('sale.action_report_saleorder').id,
+            'report_name': 'Relance_{{ object.name }}',
+            'attachment_ids': [(6, 0, cls.static_attachment.ids)],
+        })
+
+    def test_reminder_keeps_report_and_template_attachments(self):
+        self.order._queue_reminder_emails([(self.order, 1, self.template)])
+
+        reminder = self.env['sale.order.reminder'].search([('order_id', '=', self.order.id)])
+        mail = reminder.mail_id
+        self.assertEqual(len(mail), 1)
+        self.assertIn(self.static_attachment, mail.attachment_ids)
+        report = mail.attachment_ids - self.static_attachment
+        self.assertEqual(len(report), 1)
+        self.assertTrue(report.name.startswith('Relance_%s' % self.order.name))
+        self.assertEqual(report.res_model, 'mail.message')
+        self.assertEqual(report.res_id, mail.mail_message_id.id)
+
+        # Une relance déjà envoyée n'est pas régénérée
+        self.order._queue_reminder_emails([(self.order, 1, self.template)])
+        self.assertEqual(self.env['sale.order.reminder'].search_count([('order_id', '=', self.order.id)]), 1)
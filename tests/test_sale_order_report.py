@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import io
+import zipfile
+
+from odoo.tests import HttpCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSaleOrderReportBatch(HttpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestSaleOrderReportBatch, cls).setUpClass()
+        partner = cls.env['res.partner'].create({'name': 'Client impression'})
+        product = cls.env['product.product'].create({'name': 'Produit impression', 'list_price': 100.0})
+        cls.orders = cls.env['sale.order'].create([{
+            'partner_id': partner.id,
+            'order_line': [(0, 0, {'product_id': product.id, 'product_uom_qty': 1})],
+        } for _index in range(3)])
+
+    def _url(self, **params):
+        params.setdefault('ids', ','.join(str(order_id) for order_id in self.orders.ids))
+        return '/orbit/sale_order/report/batch?' + '&'.join('%s=%s' % item for item in params.items())
+
+    def test_chunk_size_not_numeric(self):
+        self.authenticate('admin', 'admin')
+        response = self.url_open(self._url(chunk_size='abc'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_zip_one_entry_per_order(self):
+        # Trois commandes rendues par lots de deux : une entrée par commande
+        self.authenticate('admin', 'admin')
+        response = self.url_open(self._url(format='zip', chunk_size=2), timeout=120)
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            names = archive.namelist()
+        self.assertEqual(sorted(names), sorted('%s.pdf' % order.name.replace('/', '_') for order in self.orders))
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import base64
+from datetime import timedelta
+
+from odoo import fields
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+
+@tagged('post_install', '-at_install')
+class TestStatementImport(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super(TestStatementImport, cls).setUpClass(chart_template_ref=chart_template_ref)
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.partner_a.ninea = 'SNA001'
+        cls.partner_b.ninea = 'SNB002'
+        product = cls.env['product.product'].create({
+            'name': 'Produit précommande',
+            'type': 'product',
+            'list_price': 1000.0,
+            'taxes_id': [(6, 0, [])],
+            'is_preorder': True,
+            'preorder_threshold': 5,
+        })
+        # Échéances (30/30/40 %) : A = 300, 300, 400 ; B = 600, 600, 800
+        cls.order_a, cls.order_b = cls.env['sale.order'].with_context(default_type_sale='preorder').create([{
+            'partner_id': partner.id,
+            'type_sale': 'preorder',
+            'client_order_ref': client_ref,
+            'commitment_date': fields.Date.today() + timedelta(days=60),
+            'order_line': [(0, 0, {'product_id': product.id, 'product_uom_qty': quantity, 'price_unit': 1000.0})],
+        } for partner, client_ref, quantity in [(cls.partner_a, 'CMD-ALPHA', 1), (cls.partner_b, 'CMD-BETA', 2)]])
+        (cls.order_a | cls.order_b).action_confirm()
+
+    def _installment(self, order, sequence):
+        return order.installment_ids.filtered(lambda installment: installment.sequence == sequence)
+
+    def _match(self, rows):
+        wizard = self._wizard("date;amount;label;ref;ninea\n" + "".join(
+            "2024-01-05;%s;%s;;%s\n" % (amount, label, ninea) for amount, label, ninea in rows))
+        wizard.action_match()
+        return {line.label: line for line in wizard.line_ids}
+
+    def _wizard(self, content, filename='releve.csv'):
+        return self.env['orbit.statement.import'].sudo().create({
+            'statement_file': base64.b64encode(content.encode()),
+            'statement_filename': filename,
+            'journal_id': self.company_data['default_journal_bank'].id,
+        })
+
+    def test_duplicate_ref_in_file(self):
+        wizard = self._wizard(
+            "date;amount;label;ref\n"
+            "2024-01-05;1500;Versement;TX001\n"
+            "2024-01-06;1500;Versement;TX001\n"
+        )
+        wizard.action_match()
+        self.assertEqual(wizard.line_ids.sorted('date').mapped('state'), ['unmatched', 'duplicate'])
+
+    def test_unreadable_csv_line(self):
+        wizard = self._wizard("date;amount;label\n2024-01-05;abc;Versement\n")
+        with self.assertRaisesRegex(UserError, 'Ligne 2'):
+            wizard.action_match()
+
+    def test_unreadable_ofx_transaction(self):
+        wizard = self._wizard(
+            "<OFX><STMTTRN><DTPOSTED>20240105<TRNAMT>1500<FITID>A1</STMTTRN>"
+            "<STMTTRN><TRNAMT>1500<FITID>A2</STMTTRN></OFX>",
+            filename='releve.ofx',
+        )
+        with self.assertRaisesRegex(UserError, 'Transaction 2'):
+            wizard.action_match()
+
+    def test_match_rules(self):
+        lines = self._match([
+            (300, 'Paiement %s' % self.order_a.name, ''),
+            (600, 'Versement CMD-BETA', ''),
+            (300, 'Virement client', 'SNA001'),
+            (800, 'Depot especes', ''),
+        ])
+        expected = {
+            'Paiement %s' % self.order_a.name: ('name', self._installment(self.order_a, 1)),
+            'Versement CMD-BETA': ('client_ref', self._installment(self.order_b, 1)),
+            # première échéance de A déjà prise par la ligne précédente : la seconde, même montant
+            'Virement client': ('ninea', self._installment(self.order_a, 2)),
+            'Depot especes': ('amount', self._installment(self.order_b, 3)),
+        }
+        for label, (rule, installment) in expected.items():
+            self.assertEqual(lines[label].state, 'matched', label)
+            self.assertEqual(lines[label].match_rule, rule, label)
+            self.assertEqual(lines[label].installment_id, installment, label)
+
+    def test_installment_settled_once(self):
+        # Deux lignes pour la seule échéance attendant 400 : la seconde reste non rapprochée
+        wizard = self._wizard(
+            "date;amount;label\n"
+            "2024-01-05;400;Virement 1\n"
+            "2024-01-06;400;Virement 2\n"
+        )
+        wizard.action_match()
+        lines = wizard.line_ids.sorted('date')
+        self.assertEqual(lines.mapped('state'), ['matched', 'unmatched'])
+        self.assertEqual(lines[0].installment_id, self._installment(self.order_a, 3))
+        self.assertFalse(lines[1].installment_id)
+
+    def test_amount_tolerance(self):
+        # Montants arrondis à la précision de la devise : 400.004 correspond, 400.01 non
+        lines = self._match([(400.01, 'Hors tolerance', ''), (400.004, 'Dans la tolerance', '')])
+        self.assertEqual(lines['Hors tolerance'].state, 'unmatched')
+        self.assertEqual(lines['Dans la tolerance'].state, 'matched')
+        self.assertEqual(lines['Dans la tolerance'].installment_id, self._installment(self.order_a, 3))
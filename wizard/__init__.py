@@ -6,4 +6,5 @@ from . import type_sale_for_quotation
 #from . import account_payment_register
 
 from . import preorder_advance_payment
+from . import statement_import
 from . import sale_make_invoice_advance
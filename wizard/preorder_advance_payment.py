@@ -3,6 +3,9 @@ from odoo import models, fields, api, _, exceptions
 from odoo.exceptions import UserError
 from odoo.tools import float_compare
 
+import base64
+import csv
+import io
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -11,7 +14,7 @@ class AccountVoucherWizard(models.TransientModel):
     _name = 'account.voucher.wizard'
     _description = "Account Voucher Wizard"
 
-    order_id = fields.Many2one('sale.order', required=True)
+    order_id = fields.Many2one('sale.order')
     journal_id = fields.Many2one('account.journal', "Journal",
                                  required=True,
                                  domain=[("type", "in", ("bank", "cash"))]
@@ -23,7 +26,7 @@ class AccountVoucherWizard(models.TransientModel):
                                           )
     currency_id = fields.Many2one('res.currency', "Currency", readonly=True)
     amount_total = fields.Monetary(readonly=True)
-    amount_advance = fields.Monetary('Amount advanced', required=True, currency_field="journal_currency_id")
+    amount_advance = fields.Monetary('Amount advanced', currency_field="journal_currency_id")
     date = fields.Date(required=True, default=fields.Date.context_today)
     currency_amount = fields.Monetary('Curr. amount', readonly=True, currency_field='currency_id')
     payment_ref = fields.Char("Ref. ")
@@ -31,16 +34,24 @@ class AccountVoucherWizard(models.TransientModel):
         selection=[("inbound", "Inbound"), ("outbound", "Outbound")],
         required=True, default='inbound'
     )
+    # Saisie multi-commandes : une ligne par (commande, montant), saisie ou importée
+    bulk = fields.Boolean("Plusieurs commandes")
+    line_ids = fields.One2many('account.voucher.wizard.line', 'wizard_id', string="Paiements")
+    import_file = fields.Binary("Fichier CSV")
+    import_filename = fields.Char("Nom du fichier")
 
     @api.depends('journal_id')
     def _compute_get_journal_currency(self):
         for wzd in self:
             wzd.journal_currency_id = (
-                wzd.journal_id.id or wzd.journal_id.company_id.currency_id.id
+                wzd.journal_id.currency_id or wzd.journal_id.company_id.currency_id
             )
 
     @api.constrains("amount_advance")
     def check_amount(self):
+        if self.bulk:
+            # saisie multi-commandes : les montants sont contrôlés par ligne
+            return
         if self.amount_advance <= 0:
             raise exceptions.ValidationError(_("Amount of advance must be positive."))
         if self.env.context.get("active_id", False):
@@ -82,6 +93,13 @@ class AccountVoucherWizard(models.TransientModel):
         sale_ids = self.env.context.get("active_ids", [])
         if not sale_ids:
             return res
+        if len(sale_ids) > 1 or self.env.context.get("orbit_bulk_payment"):
+            res["bulk"] = True
+            res["line_ids"] = [
+                (0, 0, {"order_id": sale.id, "amount": sale._get_next_installment_amount()})
+                for sale in self.env["sale.order"].browse(sale_ids)
+            ]
+            return res
         sale_id = fields.first(sale_ids)
         sale = self.env["sale.order"].browse(sale_id)
         if "amount_total" in fields_list:
@@ -108,9 +126,11 @@ class AccountVoucherWizard(models.TransientModel):
             amount_advance = self.amount_advance
         self.currency_amount = amount_advance
 
-    def _prepare_payment_vals(self, sale):
+    def _prepare_payment_vals(self, sale, amount=None, journal=None, payment_ref=None):
         partner_id = sale.partner_invoice_id.commercial_partner_id.id
-        if self.amount_advance < 0.0:
+        amount = self.amount_advance if amount is None else amount
+        journal = journal or self.journal_id
+        if amount < 0.0:
             raise UserError(
                 _(
                     "The amount to advance must always be positive. "
@@ -121,13 +141,14 @@ class AccountVoucherWizard(models.TransientModel):
 
         return {
             "date": self.date,
-            "amount": self.amount_advance,
+            "amount": amount,
             "payment_type": self.payment_type,
             "partner_type": "customer",
-            "ref": self.payment_ref or sale.name,
-            "journal_id": self.journal_id.id,
-            "currency_id": self.journal_currency_id.id,
+            "ref": payment_ref or self.payment_ref or sale.name,
+            "journal_id": journal.id,
+            "currency_id": (journal.currency_id or journal.company_id.currency_id).id,
             "partner_id": partner_id,
+            "sale_id": sale.id,
             "payment_method_id": self.env.ref(
                 "account.account_payment_method_manual_in"
             ).id,
@@ -136,6 +157,10 @@ class AccountVoucherWizard(models.TransientModel):
     def make_advance_payment(self):
         """Create customer paylines and validates the payment"""
         self.ensure_one() 
+        if self.bulk:
+            self._make_bulk_payments()
+            return {"type": "ir.actions.act_window_close"}
+
         payment_obj = self.env["account.payment"]
         sale_obj = self.env["sale.order"]
         sale_ids = self.env.context.get("active_ids", [])
@@ -144,10 +169,140 @@ class AccountVoucherWizard(models.TransientModel):
             sale = sale_obj.browse(sale_id)
             payment_vals = self._prepare_payment_vals(sale)
             payment = payment_obj.create(payment_vals)
-            sale.account_payment_ids |= payment
             payment.action_post()
         
         _logger.info(self.order_id)
         return {
             "type": "ir.actions.act_window_close",
     }
+
+    def _make_bulk_payments(self):
+        """ Crée et poste en un lot les paiements de toutes les lignes.
+
+        Les montants sont contrôlés par commande (somme des lignes d'une même commande
+        face à son reste à payer), puis le reste à payer des commandes concernées est
+        recalculé une seule fois, après la validation des paiements.
+        """
+        self.ensure_one()
+        if not self.line_ids:
+            raise UserError(_("Veuillez saisir au moins un paiement."))
+        self.line_ids._check_amounts()
+        payments = self.env["account.payment"].create([
+            self._prepare_payment_vals(line.order_id, line.amount, line.journal_id, line.payment_ref)
+            for line in self.line_ids
+        ])
+        payments.action_post()
+        self.line_ids.order_id.flush_recordset(["amount_residual"])
+        return payments
+
+    def action_import_csv(self):
+        """ Remplit les lignes depuis un fichier CSV (relevé de caisse).
+
+        Colonnes attendues : ``order`` (référence de la commande) et ``amount`` ;
+        colonnes facultatives : ``journal`` (code du journal) et ``ref``.
+        """
+        self.ensure_one()
+        if not self.import_file:
+            raise UserError(_("Veuillez charger un fichier CSV."))
+        content = base64.b64decode(self.import_file).decode("utf-8-sig")
+        dialect = csv.Sniffer().sniff(content.split("\n", 1)[0], delimiters=",;\t")
+        rows = list(csv.DictReader(io.StringIO(content), dialect=dialect))
+        if not rows or not {"order", "amount"} <= set(rows[0]):
+            raise UserError(_("Le fichier doit contenir les colonnes 'order' et 'amount'."))
+
+        # Commandes et journaux résolus en une recherche chacun
+        order_names = {row["order"].strip() for row in rows}
+        orders = {
+            order.name: order
+            for order in self.env["sale.order"].search([("name", "in", list(order_names))])
+        }
+        journal_codes = {row["journal"].strip() for row in rows if (row.get("journal") or "").strip()}
+        journals = {
+            journal.code: journal
+            for journal in self.env["account.journal"].search([
+                ("code", "in", list(journal_codes)),
+                ("type", "in", ("bank", "cash")),
+                ("company_id", "in", self.env.companies.ids),
+            ])
+        } if journal_codes else {}
+
+        line_vals = []
+        errors = []
+        for index, row in enumerate(rows, start=2):
+            order = orders.get(row["order"].strip())
+            journal_code = (row.get("journal") or "").strip()
+            if not order:
+                errors.append(_("Ligne %s : commande %s introuvable", index, row["order"]))
+                continue
+            if journal_code and journal_code not in journals:
+                errors.append(_("Ligne %s : journal %s introuvable", index, journal_code))
+                continue
+            try:
+                amount = float(row["amount"].replace(",", ".").replace(" ", ""))
+            except ValueError:
+                errors.append(_("Ligne %s : montant invalide", index))
+                continue
+            line_vals.append((0, 0, {
+                "order_id": order.id,
+                "amount": amount,
+                "journal_id": journals[journal_code].id if journal_code else False,
+                "payment_ref": (row.get("ref") or "").strip(),
+            }))
+        if errors:
+            raise UserError("\n".join(errors))
+
+        self.write({"line_ids": [(5, 0, 0)] + line_vals, "import_file": False})
+        return {
+            "type": "ir.actions.act_window",
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "new",
+        }
+
+
+class AccountVoucherWizardLine(models.TransientModel):
+    _name = 'account.voucher.wizard.line'
+    _description = "Account Voucher Wizard Line"
+
+    wizard_id = fields.Many2one('account.voucher.wizard', required=True, ondelete='cascade')
+    order_id = fields.Many2one('sale.order', "Commande", required=True)
+    partner_id = fields.Many2one(related='order_id.partner_id', string="Client")
+    amount_residual = fields.Float(related='order_id.amount_residual', string="Reste à payer")
+    journal_id = fields.Many2one('account.journal', "Journal",
+                                 domain=[("type", "in", ("bank", "cash"))],
+                                 help="Laisser vide pour utiliser le journal de l'assistant")
+    currency_id = fields.Many2one('res.currency', compute='_compute_currency_id')
+    amount = fields.Monetary("Montant", required=True, currency_field='currency_id')
+    payment_ref = fields.Char("Ref. ")
+
+    @api.depends('journal_id', 'wizard_id.journal_currency_id')
+    def _compute_currency_id(self):
+        for line in self:
+            journal = line.journal_id
+            line.currency_id = (
+                journal.currency_id or journal.company_id.currency_id
+                if journal else line.wizard_id.journal_currency_id
+            )
+
+    def _check_amounts(self):
+        """ Montants positifs et, en encaissement, inférieurs au reste à payer de chaque commande """
+        amounts = {}
+        for line in self:
+            if line.amount <= 0:
+                raise exceptions.ValidationError(
+                    _("Le montant du paiement de %s doit être positif.", line.order_id.name))
+            if not (line.journal_id or line.wizard_id.journal_id):
+                raise exceptions.ValidationError(
+                    _("Veuillez choisir un journal pour le paiement de %s.", line.order_id.name))
+            order = line.order_id
+            amounts[order] = amounts.get(order, 0.0) + line.currency_id._convert(
+                line.amount, order.currency_id, order.company_id,
+                line.wizard_id.date or fields.Date.today(),
+            )
+        if self[:1].wizard_id.payment_type != 'inbound':
+            return
+        for order, amount in amounts.items():
+            if float_compare(amount, order.amount_residual, precision_digits=2) > 0:
+                raise exceptions.ValidationError(
+                    _("Le total des paiements de %s dépasse son reste à payer.", order.name))
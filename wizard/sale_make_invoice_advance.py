@@ -79,45 +79,66 @@ class SaleAdvancePaymentInv(models.TransientModel):
             sale_orders.write({'state': 'to_delivered'})
             return res
         else:
-            self.sale_order_ids.ensure_one()
-            self = self.with_company(self.company_id)
-            order = self.sale_order_ids
-
-            invoices = []
-            if dates and amounts:
-                for i in range(3):  # Boucle pour créer 3 factures
-                    # Créer le produit de dépôt si nécessaire
-                    if not self.product_id:
-                        self.product_id = self.env['product.product'].create(
-                            self._prepare_down_payment_product_values()
-                        )
-                        self.env['ir.config_parameter'].sudo().set_param(
-                            'sale.default_deposit_product_id', self.product_id.id)
-
-                    # Créer la section de paiement anticipé si nécessaire
-                    if not any(line.display_type and line.is_downpayment for line in order.order_line):
-                        self.env['sale.order.line'].create(
-                            self._prepare_down_payment_section_values(order)
-                        )
-
-                    down_payment_so_line = self.env['sale.order.line'].create(
-                        self._prepare_so_line_values(order)
-                    )
-
-                    invoice = self.env['account.move'].sudo().create(
-                        self._prepare_invoice_values(order, down_payment_so_line, dates[i], amounts[i])
-                    ).with_user(self.env.uid)  # Unsudo the invoice after creation
-
-                    invoice.message_post_with_view(
-                        'mail.message_origin_link',
-                        values={'self': invoice, 'origin': order},
-                        subtype_id=self.env.ref('mail.mt_note').id)
-
-                    invoice.action_post()
-
-                invoices.append(invoice)
-
-            return invoices
+            if not (dates and amounts):
+                return self.env['account.move']
+            schedules = {order: list(zip(dates, amounts)) for order in sale_orders}
+            return self._create_installment_invoices(schedules)
+
+    def _create_installment_invoices(self, schedules):
+        """ Crée en une passe les factures d'échéance d'un ensemble de commandes.
+
+        ``schedules`` associe à chaque commande la liste de ses échéances (date,
+        montant). Sections, lignes d'acompte et factures sont créées chacune par un
+        seul create, les factures postées ensemble et les notes de chatter écrites
+        en un lot.
+        """
+        self.ensure_one()
+        self = self.with_company(self.company_id)
+        if not schedules:
+            return self.env['account.move']
+
+        # Créer le produit de dépôt si nécessaire
+        if not self.product_id:
+            self.product_id = self.env['product.product'].create(
+                self._prepare_down_payment_product_values()
+            )
+            self.env['ir.config_parameter'].sudo().set_param(
+                'sale.default_deposit_product_id', self.product_id.id)
+
+        # Créer les sections de paiement anticipé manquantes
+        SaleOrderLine = self.env['sale.order.line']
+        SaleOrderLine.create([
+            self._prepare_down_payment_section_values(order)
+            for order in schedules
+            if not any(line.display_type and line.is_downpayment for line in order.order_line)
+        ])
+
+        # Une ligne d'acompte par échéance, au montant de l'échéance
+        line_vals_list = []
+        for order, schedule in schedules.items():
+            so_line_values = self._prepare_so_line_values(order)
+            for offset, (date, amount) in enumerate(schedule):
+                line_vals_list.append(dict(
+                    so_line_values, price_unit=amount, sequence=so_line_values['sequence'] + offset))
+        down_payment_so_lines = iter(SaleOrderLine.create(line_vals_list))
+
+        invoice_vals_list = []
+        invoice_orders = []
+        for order, schedule in schedules.items():
+            for date, amount in schedule:
+                invoice_vals_list.append(
+                    self._prepare_invoice_values(order, next(down_payment_so_lines), date, amount))
+                invoice_orders.append(order)
+        invoices = self.env['account.move'].sudo().create(invoice_vals_list).with_user(self.env.uid)  # Unsudo the invoice after creation
+
+        QWeb = self.env['ir.qweb']
+        invoices._message_log_batch(bodies={
+            invoice.id: QWeb._render('mail.message_origin_link', {'self': invoice, 'origin': order}, minimal_qcontext=True)
+            for invoice, order in zip(invoices, invoice_orders)
+        })
+
+        invoices.action_post()
+        return invoices
 
     def _prepare_invoice_values(self, order, so_line, date, amount):
         self.ensure_one()
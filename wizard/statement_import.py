@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+import base64
+import csv
+import io
+import re
+from collections import defaultdict
+from datetime import datetime
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import float_round, split_every
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Règles de rapprochement, par ordre de priorité
+MATCH_RULES = [
+    ('name', "Référence commande"),
+    ('client_ref', "Référence client"),
+    ('ninea', "NINEA"),
+    ('amount', "Montant attendu"),
+]
+
+# Mots d'un libellé pouvant correspondre à une référence (S00042, SO/2024/0042, ...)
+TOKEN_RE = re.compile(r'[A-Z0-9][A-Z0-9/_.-]*[A-Z0-9]')
+OFX_TRANSACTION_RE = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.S | re.I)
+OFX_TAG_RE = re.compile(r'<(\w+)>([^<\r\n]*)')
+CSV_DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y')
+
+
+class StatementImport(models.TransientModel):
+    """ Import d'un relevé bancaire / mobile money et rapprochement avec les échéances.
+
+    Les échéances ouvertes sont chargées une fois et indexées en mémoire (référence de
+    commande, référence client, NINEA, montant attendu) : chaque ligne du relevé est
+    rapprochée par des recherches en dictionnaire, sans requête par ligne.
+    """
+    _name = 'orbit.statement.import'
+    _description = "Import de relevé et rapprochement des échéances"
+
+    statement_file = fields.Binary("Relevé (CSV/OFX)", required=True)
+    statement_filename = fields.Char("Nom du fichier")
+    journal_id = fields.Many2one('account.journal', "Journal", required=True,
+                                 domain=[("type", "in", ("bank", "cash"))])
+    line_ids = fields.One2many('orbit.statement.import.line', 'import_id', string="Lignes")
+    matched_count = fields.Integer("Lignes rapprochées", compute='_compute_counts')
+    unmatched_count = fields.Integer("Lignes non rapprochées", compute='_compute_counts')
+
+    @api.depends('line_ids.state')
+    def _compute_counts(self):
+        for wizard in self:
+            states = wizard.line_ids.mapped('state')
+            wizard.matched_count = states.count('matched')
+            wizard.unmatched_count = states.count('unmatched')
+
+    # ------------------------------------------------------------------ Lecture
+
+    def _parse_statement(self):
+        """ Retourne la liste des transactions du fichier : dict date, amount, label, ref, ninea """
+        content = base64.b64decode(self.statement_file).decode('utf-8-sig', errors='replace')
+        if (self.statement_filename or '').lower().endswith('.ofx') or '<OFX>' in content[:2000].upper():
+            return self._parse_ofx(content)
+        return self._parse_csv(content)
+
+    @api.model
+    def _parse_ofx(self, content):
+        transactions = []
+        for index, block in enumerate(OFX_TRANSACTION_RE.findall(content), start=1):
+            tags = {tag.upper(): value.strip() for tag, value in OFX_TAG_RE.findall(block)}
+            try:
+                transactions.append({
+                    'date': datetime.strptime(tags['DTPOSTED'][:8], '%Y%m%d').date(),
+                    'amount': float(tags['TRNAMT'].replace(',', '.')),
+                    'label': ' '.join(filter(None, [tags.get('NAME'), tags.get('MEMO')])),
+                    'ref': tags.get('FITID', ''),
+                    'ninea': '',
+                })
+            except (KeyError, ValueError):
+                raise UserError(_("Transaction %s du relevé OFX illisible : DTPOSTED et TRNAMT attendus.", index))
+        return transactions
+
+    @api.model
+    def _parse_csv(self, content):
+        """ Colonnes attendues : date, amount, label ; facultatives : ref, ninea """
+        try:
+            dialect = csv.Sniffer().sniff(content.split('\n', 1)[0], delimiters=',;\t')
+        except csv.Error:
+            raise UserError(_("Ligne 1 du relevé illisible : séparateur (virgule, point-virgule ou tabulation) introuvable."))
+        transactions = []
+        for index, row in enumerate(csv.DictReader(io.StringIO(content), dialect=dialect), start=2):
+            try:
+                transactions.append({
+                    'date': self._parse_csv_date(row['date']),
+                    'amount': float(row['amount'].replace(' ', '').replace(',', '.')),
+                    'label': (row.get('label') or '').strip(),
+                    'ref': (row.get('ref') or '').strip(),
+                    'ninea': (row.get('ninea') or '').strip(),
+                })
+            except (KeyError, ValueError, AttributeError, csv.Error):
+                raise UserError(_("Ligne %s du relevé illisible : colonnes date, amount et label attendues.", index))
+        return transactions
+
+    @api.model
+    def _parse_csv_date(self, value):
+        for date_format in CSV_DATE_FORMATS:
+            try:
+                return datetime.strptime(value.strip(), date_format).date()
+            except ValueError:
+                continue
+        raise ValueError(value)
+
+    # ------------------------------------------------------------- Rapprochement
+
+    def _build_installment_index(self):
+        """ Index en mémoire des échéances ouvertes des précommandes et commandes à crédit.
+
+        Une seule recherche, les commandes et partenaires étant chargés par lots grâce
+        au prefetch. Les clés ambiguës (même référence client ou même montant pour
+        plusieurs commandes) sont conservées en liste et départagées au rapprochement.
+        """
+        installments = self.env['sale.order.installment'].search([
+            ('state', '!=', 'paid'),
+            ('order_id.type_sale', 'in', ('preorder', 'creditorder')),
+            ('order_id.state', 'in', ('sale', 'to_delivered')),
+            ('order_id.company_id', '=', self.journal_id.company_id.id),
+        ], order='order_id, sequence')
+        index = {
+            'name': {},
+            'client_ref': defaultdict(list),
+            'ninea': defaultdict(list),
+            'amount': defaultdict(list),
+            'installments': defaultdict(list),
+        }
+        digits = self.journal_id.company_id.currency_id.decimal_places
+        for installment in installments:
+            order = installment.order_id
+            if order.id not in index['installments']:
+                index['name'][order.name.upper()] = order
+                if order.client_order_ref:
+                    index['client_ref'][order.client_order_ref.strip().upper()].append(order)
+                ninea = order.partner_id.commercial_partner_id.ninea
+                if ninea:
+                    index['ninea'][ninea.strip().upper()].append(order)
+            open_amount = float_round(installment.amount - installment.paid_amount, precision_digits=digits)
+            index['installments'][order.id].append((installment, open_amount))
+            index['amount'][open_amount].append(installment)
+        return index
+
+    @api.model
+    def _match_transaction(self, transaction, index, digits):
+        """ Retourne (échéance, règle) pour une transaction, (False, False) sinon """
+        amount = float_round(transaction['amount'], precision_digits=digits)
+        tokens = TOKEN_RE.findall(('%s %s' % (transaction['label'], transaction['ref'])).upper())
+
+        for token in tokens:
+            order = index['name'].get(token)
+            if order:
+                return self._pick_installment(order, amount, index), 'name'
+        for token in tokens:
+            orders = index['client_ref'].get(token)
+            if orders and len(orders) == 1:
+                return self._pick_installment(orders[0], amount, index), 'client_ref'
+
+        ninea_keys = [transaction['ninea'].upper()] if transaction['ninea'] else tokens
+        for key in ninea_keys:
+            orders = index['ninea'].get(key)
+            if not orders:
+                continue
+            if len(orders) == 1:
+                return self._pick_installment(orders[0], amount, index), 'ninea'
+            # plusieurs commandes du même client : celle dont une échéance attend ce montant
+            candidates = [
+                installment for order in orders
+                for installment, open_amount in index['installments'][order.id]
+                if open_amount == amount
+            ]
+            if len(candidates) == 1:
+                return candidates[0], 'ninea'
+
+        installments = index['amount'].get(amount)
+        if installments and len(installments) == 1:
+            return installments[0], 'amount'
+        return False, False
+
+    @api.model
+    def _pick_installment(self, order, amount, index):
+        """ L'échéance ouverte de la commande attendant ce montant, à défaut la première """
+        open_installments = index['installments'][order.id]
+        for installment, open_amount in open_installments:
+            if open_amount == amount:
+                return installment
+        return open_installments[0][0]
+
+    @api.model
+    def _consume_installment(self, installment, index):
+        """ Retire de l'index une échéance rapprochée : une autre ligne du relevé ne peut
+        plus la prendre. Une commande sans échéance restante sort de toutes les clés. """
+        order = installment.order_id
+        remaining = []
+        for candidate, open_amount in index['installments'].get(order.id, []):
+            if candidate == installment:
+                index['amount'][open_amount].remove(installment)
+            else:
+                remaining.append((candidate, open_amount))
+        if remaining:
+            index['installments'][order.id] = remaining
+            return
+        index['installments'].pop(order.id, None)
+        index['name'].pop(order.name.upper(), None)
+        keys = [('client_ref', order.client_order_ref), ('ninea', order.partner_id.commercial_partner_id.ninea)]
+        for key, value in keys:
+            orders = index[key].get(value.strip().upper()) if value else None
+            if orders and order in orders:
+                orders.remove(order)
+
+    def action_match(self):
+        """ Lit le relevé et rapproche chaque ligne d'une échéance ouverte """
+        self.ensure_one()
+        transactions = self._parse_statement()
+        if not transactions:
+            raise UserError(_("Aucune transaction trouvée dans le relevé."))
+
+        index = self._build_installment_index()
+        digits = self.journal_id.company_id.currency_id.decimal_places
+        # Transactions déjà importées : une seule recherche sur les références
+        refs = [transaction['ref'] for transaction in transactions if transaction['ref']]
+        known_refs = set(self.env['account.payment'].search([
+            ('ref', 'in', refs), ('journal_id', '=', self.journal_id.id),
+        ]).mapped('ref')) if refs else set()
+
+        line_vals_list = []
+        for transaction in transactions:
+            vals = dict(transaction, import_id=self.id)
+            if transaction['amount'] <= 0:
+                vals['state'] = 'ignored'
+            elif transaction['ref'] and transaction['ref'] in known_refs:
+                # déjà importée, ou référence répétée dans le même fichier
+                vals['state'] = 'duplicate'
+            else:
+                known_refs.add(transaction['ref'])
+                installment, rule = self._match_transaction(transaction, index, digits)
+                if installment:
+                    self._consume_installment(installment, index)
+                    vals.update({
+                        'installment_id': installment.id,
+                        'order_id': installment.order_id.id,
+                        'match_rule': rule,
+                        'state': 'matched',
+                    })
+                else:
+                    vals['state'] = 'unmatched'
+            line_vals_list.append(vals)
+
+        self.line_ids.unlink()
+        self.env['orbit.statement.import.line'].create(line_vals_list)
+        return self._reopen()
+
+    def action_create_payments(self, batch_size=1000):
+        """ Crée et poste par lots les paiements des lignes rapprochées (liés via sale_id) """
+        self.ensure_one()
+        lines = self.line_ids.filtered(lambda line: line.state == 'matched' and line.order_id)
+        if not lines:
+            raise UserError(_("Aucune ligne rapprochée à enregistrer."))
+
+        journal = self.journal_id
+        currency = journal.currency_id or journal.company_id.currency_id
+        payment_method = self.env.ref('account.account_payment_method_manual_in')
+        Payment = self.env['account.payment']
+        for line_ids in split_every(batch_size, lines.ids):
+            batch = lines.browse(line_ids)
+            payments = Payment.create([{
+                'date': line.date,
+                'amount': line.amount,
+                'payment_type': 'inbound',
+                'partner_type': 'customer',
+                'ref': line.ref or line.label or line.order_id.name,
+                'journal_id': journal.id,
+                'currency_id': currency.id,
+                'partner_id': line.order_id.partner_invoice_id.commercial_partner_id.id,
+                'sale_id': line.order_id.id,
+                'payment_method_id': payment_method.id,
+            } for line in batch])
+            payments.action_post()
+            for line, payment in zip(batch, payments):
+                line.payment_id = payment
+            batch.state = 'done'
+            batch.order_id.flush_recordset(['amount_residual'])
+        _logger.info("Relevé %s : %s paiement(s) créé(s)", self.statement_filename, len(lines))
+        return self._reopen()
+
+    def _reopen(self):
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+
+class StatementImportLine(models.TransientModel):
+    _name = 'orbit.statement.import.line'
+    _description = "Ligne de relevé importée"
+    _order = 'state desc, date, id'
+
+    import_id = fields.Many2one('orbit.statement.import', required=True, ondelete='cascade')
+    date = fields.Date("Date")
+    amount = fields.Float("Montant", digits='Account')
+    label = fields.Char("Libellé")
+    ref = fields.Char("Référence")
+    ninea = fields.Char("NINEA")
+    order_id = fields.Many2one('sale.order', "Commande")
+    installment_id = fields.Many2one('sale.order.installment', "Échéance")
+    match_rule = fields.Selection(MATCH_RULES, string="Rapproché par")
+    payment_id = fields.Many2one('account.payment', "Paiement", readonly=True)
+    state = fields.Selection([
+        ('matched', "Rapprochée"),
+        ('unmatched', "Non rapprochée"),
+        ('duplicate', "Déjà importée"),
+        ('ignored', "Ignorée"),
+        ('done', "Payée"),
+    ], string="État", default='unmatched')
+
+    @api.onchange('order_id')
+    def _onchange_order_id(self):
+        # rapprochement manuel d'une ligne
+        for line in self:
+            if line.order_id and line.state == 'unmatched':
+                line.state = 'matched'